@@ -1,6 +1,8 @@
 #!/usr/bin/env python
 import argparse, sys, os
+from pathlib import Path
 from .interactive_path_selector import InteractivePathSelector
+from . import export
 from .config import read_user_config_file
 
 def printerr(*args, **kwargs):
@@ -31,12 +33,52 @@ def main():
     help="List directories at the top of the page instead of sorted with file names"
   )
 
+  parser.add_argument(
+    "--sort", '-s', type=str, default=None, choices=('plain', 'casefold', 'natural', 'version'),
+    help="Sort names plainly by code point (default), ignoring case, naturally with file2 before file10, or by version with 1.0rc1 before 1.0. Cycled with the s key"
+  )
+
+  parser.add_argument(
+    "--preview", '-p', action="store_true",
+    help="Show a preview of the entry under the cursor next to the listing: the start of a text file, a hex dump of a binary file or the contents of a directory. Toggled with the p key"
+  )
+
+  parser.add_argument(
+    "--watch", '-w', action="store_true",
+    help="Update the listing live as files are created, deleted or renamed in the current directory"
+  )
+
   parser.add_argument(
     "--json", '-j', action="store_true",
     help="Return output as JSON string hiearchy instead of a newline-separated list of paths"
   )
 
-  parser.add_argument(                          # TODO: implement
+  parser.add_argument(
+    "--null", '-0', action="store_true",
+    help="Separate output paths with NUL instead of newline characters, e.g. for xargs -0"
+  )
+
+  parser.add_argument(
+    "--expand", '-e', action="store_true",
+    help="Output the files beneath selected directories instead of the directories themselves, reading independent subtrees in parallel"
+  )
+
+  parser.add_argument(
+    "--max-depth", type=int, default=None, metavar="<DEPTH>",
+    help="With --expand, output directories more than DEPTH levels beneath a selected directory as they are instead of expanding them"
+  )
+
+  parser.add_argument(
+    "--follow-symlinks", '-L', action="store_true",
+    help="With --expand, expand symlinked directories instead of outputting the links. Each directory is still expanded only once"
+  )
+
+  parser.add_argument(
+    "--dedup", action="store_true",
+    help="With --expand, output a file reached through several hard or symbolic links only once"
+  )
+
+  parser.add_argument(
     "--load-json", '-J', type=str, default=None, metavar="<JSON FILE OR STRING>",
     help=f"""
       Load JSON selection (possibly the output of a previous session with --json) as the initial selection in an interactive session, as opposed to nothing selected initially.
@@ -45,6 +87,26 @@ def main():
     """
   )
 
+  parser.add_argument(
+    "--batch", '-b', action="store_true",
+    help="Select without an interactive session: walk root and output every file, or every path matching --include, that no --exclude rule matches. Implied by --include and --exclude"
+  )
+
+  parser.add_argument(
+    "--include", '-i', type=str, action="append", default=[], metavar="<PATTERN>",
+    help="In batch mode, select the paths matching PATTERN, a glob relative to root where ** spans directories, or a regex when prefixed with 're:'. A pattern without '/' matches names at any depth and a trailing '/' matches only directories, which are selected as a whole. Repeatable"
+  )
+
+  parser.add_argument(
+    "--exclude", '-x', type=str, action="append", default=[], metavar="<PATTERN>",
+    help="In batch mode, skip the paths matching PATTERN, and everything beneath them, even if they match --include. Same syntax as --include. Repeatable"
+  )
+
+  parser.add_argument(
+    "--session", '-S', type=str, default=None, metavar="<NAME>",
+    help="Resume the interactive session saved under NAME, with its selection, current directory, cursor and directory listings, and save it there again on exit and periodically. Without a root argument the session's root is used"
+  )
+
   parser.add_argument(
     "--ascii", action="store_true",
     help="Use plain ASCII characters instead of unicode characters for symbols indicating selection states in an interactive session"
@@ -65,16 +127,28 @@ def main():
     help="path to configuration file"
   )
 
-  args = parser.parse_args()
+  parser.add_argument(
+    "--profile", action="store_true",
+    help="record the latency and tty output of every key, and the time spent listing, sorting and drawing, then write a summary to stderr on exit"
+  )
 
-  user_config_file, config = read_user_config_file()
+  parser.add_argument(
+    "--profile-file", type=str, default=None, metavar="<FILE>",
+    help="like --profile, but write the summary to FILE"
+  )
 
-  if not os.isatty(sys.stdin.fileno()):
-    user_stdin = sys.stdin.read().strip()
+  parser.add_argument(
+    "--cprofile", type=str, default=None, metavar="<FILE>",
+    help="dump a cProfile trace of the interactive session to FILE, readable with pstats"
+  )
+
+  args = parser.parse_args()
+  if args.max_depth is not None and args.max_depth < 0:
+    parser.error("--max-depth must not be negative")
+
+  user_config_file, config = read_user_config_file(args.config)
 
   if args.verbose:
-    if user_stdin:
-      printerr(f"Data from stdin:\n{user_stdin}\n")
     if user_config_file is None:
       message = "Loaded default config"
     else:
@@ -82,26 +156,136 @@ def main():
     printerr(message)
     printerr(config)
 
-  selection_output = ''
-  with InteractivePathSelector( root        = args.root,
-                                show_hidden = args.show_hidden,
-                                dirs_first  = args.dirs_first,
-                                style       = config['style']  ) as ips:
-    ips.draw_page()
+  defaults = config.get('default', {})
 
+  if args.batch or args.include or args.exclude:
+    sys.exit(batch(parser, args))
+
+  profiler = None
+  if args.profile or args.profile_file is not None or args.cprofile is not None:
+    from .profiler import Profiler
+    profiler = Profiler(args.cprofile)
+
+  session, snapshot, root = None, None, args.root
+  if args.session is not None:
+    from .session import Session
     try:
-      while ips.read_key(): continue
-    except KeyboardInterrupt:
-      sys.exit(1)
+      session = Session(args.session)
+    except ValueError as error:
+      parser.error(str(error))
+    snapshot = session.load()
+    if snapshot is not None and root is None:
+      root = snapshot['root']
+
+  ips = InteractivePathSelector( root        = root,
+                                 show_hidden = args.show_hidden,
+                                 dirs_first  = args.dirs_first,
+                                 sort        = args.sort or defaults.get('sort', 'plain'),
+                                 style       = config['style'],
+                                 listing_cache_size = defaults.get('listing_cache_size', 100000),
+                                 stream_threshold   = defaults.get('stream_threshold', 20000),
+                                 watch              = args.watch or defaults.get('watch', False),
+                                 selection_usage    = defaults.get('selection_usage', True),
+                                 preview            = args.preview or defaults.get('preview', False) )
 
+  if snapshot is not None and not session.restore(ips, snapshot):
+    printerr(f"Session {session.name} was saved under {snapshot['root']}, starting it afresh under {ips.root}")
 
+  importer = None
+  if args.load_json is not None or not os.isatty(sys.stdin.fileno()):
+    from .importer import SelectionImporter, load_json_selection, read_path_list
+    importer = SelectionImporter(ips.root)
+    if args.load_json is not None:
+      importer.add_dict(load_json_selection(args.load_json))
+    if not os.isatty(sys.stdin.fileno()):
+      importer.add_paths(read_path_list(sys.stdin.buffer))
+    importer.merge_into(ips.selection)
+    if importer.dropped:
+      printerr(f"Dropped {len(importer.dropped)} imported paths which do not exist or are outside {ips.root}")
+      for path in importer.dropped if args.verbose else importer.dropped[:10]:
+        printerr(f"  {path}")
+    if args.verbose:
+      printerr(f"Imported {importer.imported} selected paths")
+
+  try:
+    with ips:
+      if profiler is not None:
+        profiler.instrument(ips)
+      ips.draw_page()
+      if ips.preview is not None:
+        ips.update_preview()
+      if importer is not None:
+        ips.draw_header_alert(f"Imported {importer.imported} selected paths, dropped {len(importer.dropped)}")
+      ips.flush()
+      if session is not None:
+        session.start_autosave(ips, defaults.get('session_autosave_interval', 60))
+
+      try:
+        ips.run()
+      except KeyboardInterrupt:
+        sys.exit(1)
+  finally:
+    if session is not None:
+      session.stop_autosave()
+      try:
+        session.save(ips)
+      except OSError as error:
+        printerr(f"Could not save session {session.name} to {session.path}: {error}")
+    if profiler is not None: # after the TUI has left the alternate screen
+      profiler.report(args.profile_file)
+
+  if not write_output(args, str(ips.root), ips.selection):
+    sys.exit(1)
+
+
+def write_output(args, root, selection):
+  """Write the selection to stdout as requested by args. Returns False if some selected directory
+  could not be expanded."""
+  expander = None
+  if args.expand:
+    from .expand import SelectionExpander
+    expander = SelectionExpander(args.max_depth, args.follow_symlinks, args.dedup)
+  try:
     if args.json:
       import json
-      selection_output = json.dumps(ips.get_selection_dict(), separators=(',', ':'))
+      if expander is None: selection = export.selection_dict(selection)
+      else:                selection = expander.selection_dict(root, selection)
+      print(json.dumps(selection, separators=(',', ':')))
     else:
-      selection_output = '\n'.join(ips.get_selection_paths())
+      sys.stdout.flush()
+      if expander is None: paths = export.iter_selection_paths(root, selection)
+      else:                paths = expander.iter_paths(root, selection)
+      export.write_paths(sys.stdout.buffer, paths, '\0' if args.null else '\n')
+      sys.stdout.buffer.flush()
+  except BrokenPipeError: # the reader, e.g. head, exited early
+    os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    sys.exit(1)
+  if expander is None: return True
+  for path, error in expander.errors:
+    printerr(f"Cannot read {path}: {error}")
+  return not expander.errors
+
 
-  print(selection_output)
+def batch(parser, args):
+  """Run the selection headlessly, without opening the terminal. Returns the exit status, 1 if
+  some directory could not be read, like find."""
+  from .batch import BatchSelection, PathRules
+  import re
+  root = Path(args.root or '.').expanduser().resolve()
+  if not root.is_dir():
+    parser.error(f"Path '{root}' is not a directory")
+  try:
+    rules = PathRules(args.include, args.exclude)
+  except re.error as error:
+    parser.error(f"Invalid pattern: {error}")
+  walk      = BatchSelection(root, rules, show_hidden=args.show_hidden)
+  selection = walk.run()
+  for path, error in walk.errors:
+    printerr(f"Cannot read {path}: {error}")
+  if args.verbose:
+    printerr(f"Selected {selection.count} paths")
+  written = write_output(args, str(root), selection)
+  return 1 if walk.errors or not written else 0
 
 
 if __name__ == '__main__':
@@ -0,0 +1,157 @@
+import os, re, threading
+from concurrent.futures import ThreadPoolExecutor
+from .selection import SelectionTree
+
+
+def glob_to_regex(pattern):
+  """Translate a glob over '/' separated paths relative to root into a regex. * and ? stay within
+  one path component, ** spans any number of components and [...] is a character class. A pattern
+  without a '/' matches names at any depth, like in .gitignore; a leading '/' anchors it to root."""
+  anchored = '/' in pattern
+  pattern  = pattern.lstrip('/')
+  regex, i, n = [], 0, len(pattern)
+  while i < n:
+    c = pattern[i]
+    i += 1
+    if c == '*' and pattern.startswith('*', i):
+      i += 1
+      if pattern.startswith('/', i): # **/ matches zero or more directories
+        i += 1
+        regex.append('(?:.*/)?')
+      else:
+        regex.append('.*')
+    elif c == '*':
+      regex.append('[^/]*')
+    elif c == '?':
+      regex.append('[^/]')
+    elif c == '[' and (end := pattern.find(']', i + 1)) != -1:
+      members = pattern[i:end].replace('\\', '\\\\')
+      if members.startswith('!'): members = '^' + members[1:]
+      regex.append(f'[{members}]')
+      i = end + 1
+    else:
+      regex.append(re.escape(c))
+  return ('' if anchored else '(?:.*/)?') + ''.join(regex)
+
+
+class PathRule():
+  """A glob, or a regex when prefixed with 're:', matched against paths relative to root. A glob
+  ending in '/' only matches directories. Regexes are searched for anywhere in the path."""
+  __slots__ = ('pattern', 'match', 'directories_only')
+
+
+  def __init__(self, pattern):
+    self.pattern = pattern
+    if pattern.startswith('re:'):
+      self.match = re.compile(pattern[3:]).search
+      self.directories_only = False
+    else:
+      self.match = re.compile(glob_to_regex(pattern.rstrip('/'))).fullmatch
+      self.directories_only = pattern.endswith('/')
+
+
+  def matches(self, relative, is_dir):
+    return (is_dir or not self.directories_only) and self.match(relative) is not None
+
+
+  def __repr__(self):
+    return f"{self.__class__.__name__}({self.pattern!r})"
+
+
+class PathRules():
+  """Include and exclude rules. Excluded entries are skipped along with everything beneath them.
+  Without include rules every file is included; an included directory is selected as a whole."""
+
+  def __init__(self, include=(), exclude=()):
+    self.include = [ PathRule(pattern) for pattern in include ]
+    self.exclude = [ PathRule(pattern) for pattern in exclude ]
+
+
+  def excluded(self, relative, is_dir):
+    return any( rule.matches(relative, is_dir) for rule in self.exclude )
+
+
+  def included(self, relative, is_dir):
+    if not self.include: return not is_dir
+    return any( rule.matches(relative, is_dir) for rule in self.include )
+
+
+class BatchSelection():
+  """Select the entries beneath root matching rules without a terminal, for scripts, cron and CI.
+  Like SearchIndex, the tree is walked by a pool of threads each reading a directory with a single
+  os.scandir pass, and excluded or included directories are never entered. Symlinked directories
+  are not followed. Unreadable directories are collected in errors."""
+
+  def __init__(self, root, rules, show_hidden=False, workers=None):
+    self.root        = os.fspath(root)
+    self.rules       = rules
+    self.show_hidden = show_hidden
+    self.workers     = workers or min(32, (os.cpu_count() or 1) + 4)
+    self.selected    = [] # paths relative to root, as tuples of names
+    self.errors      = [] # (path, error message) of directories that could not be read
+    self.exception   = None # first unexpected exception of a worker, re-raised by run()
+    self.pending     = 0
+    self.lock        = threading.Lock()
+    self.finished    = threading.Event()
+    self.executor    = None
+
+
+  def run(self):
+    """Walk root and return the SelectionTree of the matching entries, in path order"""
+    with ThreadPoolExecutor(self.workers, thread_name_prefix='BatchSelection') as self.executor:
+      self.submit(self.root, ())
+      self.finished.wait()
+    if self.exception is not None: # rather than output a partial selection
+      raise self.exception
+    tree = SelectionTree()
+    for parts in sorted(self.selected):
+      tree.descendant(parts[:-1]).select(parts[-1])
+    return tree
+
+
+  def submit(self, path, parts):
+    with self.lock:
+      self.pending += 1
+    self.executor.submit(self.scan, path, parts)
+
+
+  def scan(self, path, parts):
+    """Read path and, depth first, the directories beneath it, handing subdirectories to the pool
+    only while it has idle workers"""
+    try:
+      todo = [(path, parts)]
+      while todo:
+        selected, subdirectories = self.read(*todo.pop())
+        self.selected.extend(selected) # a single extend, atomic under the GIL
+        for subdirectory in subdirectories:
+          if self.pending < self.workers: self.submit(*subdirectory)
+          else:                           todo.append(subdirectory)
+    except BaseException as exception: # the futures are never read, so it would be lost
+      if self.exception is None: self.exception = exception
+    finally:
+      with self.lock:
+        self.pending -= 1
+        finished = self.pending == 0 # subdirectories are queued before their parent finishes
+      if finished:
+        self.finished.set()
+
+
+  def read(self, path, parts):
+    selected, subdirectories = [], []
+    prefix = '/'.join(parts) + '/' if parts else ''
+    try:
+      with os.scandir(path) as iterator:
+        for direntry in iterator:
+          name = direntry.name
+          if not self.show_hidden and name.startswith('.'): continue
+          try:            is_dir = direntry.is_dir(follow_symlinks=False)
+          except OSError: is_dir = False
+          relative = prefix + name
+          if self.rules.excluded(relative, is_dir): continue
+          if self.rules.included(relative, is_dir):
+            selected.append((*parts, name))
+          elif is_dir:
+            subdirectories.append((direntry.path, (*parts, name)))
+    except OSError as error:
+      self.errors.append((path, error.strerror or str(error)))
+    return selected, subdirectories
@@ -1,16 +1,23 @@
-from configparser import ConfigParser
 from pathlib      import Path
-from importlib.resources import read_text
+from .style       import Style
 import os
+import pickle
 import re
 
 default_config = {
   'default': { 'ascii':       True,
                'dirs_first':  False,
+               'sort':        'plain',
                'json':        False,
                'relative':    False,
                'show_hidden': False,
-               'verbose':     False },
+               'verbose':     False,
+               'listing_cache_size': 100000,
+               'stream_threshold':   20000,
+               'watch':              False,
+               'selection_usage':    True,
+               'preview':            False,
+               'session_autosave_interval': 60 },
  'style': { 'active':          {'bold': True, 'prefix': '> ', 'reset': False},
             'inactive':        {'prefix': ' '},
             'unselected':      {'prefix': ''},
@@ -18,6 +25,7 @@ default_config = {
             'nested_selected': {'bold': True, 'foreground': 6, 'prefix': '~'},
             'truncated':       {'prefix': '...', 'suffix': '...'},
             'header':          {'reverse': True},
+            'preview':         {'prefix': '| '},
             'file':            {},
             'directory':       {'foreground': 3, 'suffix': '/'},
             'symlink':         {'suffix': '@'},
@@ -32,7 +40,6 @@ package_name = __name__.partition('.')[0]
 config_file_name = 'config.ini'
 default_config_path = package_directory / config_file_name
 home = Path.home()
-config_parser = ConfigParser()
 nested_option_regex = re.compile(r'[.:/]')
 
 if (xdg_config_home := os.getenv('XDG_CONFIG_HOME', False)):
@@ -40,6 +47,8 @@ if (xdg_config_home := os.getenv('XDG_CONFIG_HOME', False)):
 else:
   config_home = home / '.config'
 config_home /= package_name
+config_cache_path = config_home / 'config.cache'
+CONFIG_CACHE_VERSION = 1
 
 user_config_file_paths = [
   home / f'.{package_name}/{config_file_name}',
@@ -62,7 +71,7 @@ def _get_typed(section, option):
     return option[0]
 
 
-def _read_config():
+def _read_config(config_parser):
   config = {}
   for section_name in config_parser.sections():
     section = config_parser[section_name]
@@ -81,23 +90,89 @@ def _read_config():
   return config
 
 
-def read_user_config_file(extra_config_file_path=None):
+def _parse_user_config_file(extra_config_file_path=None):
+  from configparser import ConfigParser
+  config_parser = ConfigParser()
   config_path_iter = map(str, [extra_config_file_path] + user_config_file_paths)
   config_file_path = config_parser.read(config_path_iter)
   if config_file_path:                                                     # module exists as directory
-    return (config_file_path[0], _read_config())
-  elif (default_config_text := read_text(package_name, config_file_name)): # module is a zipapp
+    return (config_file_path[0], _read_config(config_parser))
+  from importlib.resources import read_text
+  if (default_config_text := read_text(package_name, config_file_name)):   # module is a zipapp
     config_parser.read_string(default_config_text)
-    return (default_config_path, _read_config())
+    return (default_config_path, _read_config(config_parser))
   else:                                                                    # failsafe
       return (None, default_config)
 
 
+def _build_styles(config):
+  """Replace the option dicts of the style section with the Style objects built from them"""
+  styles = { name: Style(**options) for name, options in config.get('style', {}).items() }
+  return { **config, 'style': styles }
+
+
+def _config_sources(extra_config_file_path=None):
+  """The stat stamps a cached config depends on: every candidate config file, present or not, and
+  the package itself (a directory, or the zipapp holding it) for the bundled default config"""
+  paths = [ Path(extra_config_file_path) ] if extra_config_file_path else []
+  paths += user_config_file_paths
+  paths.append(next( (p for p in [package_directory, *package_directory.parents] if p.exists()),
+                     package_directory ))
+  sources = []
+  for path in paths:
+    try:
+      st = os.stat(path)
+      sources.append((str(path), st.st_mtime_ns, st.st_size))
+    except OSError:
+      sources.append((str(path), None, None))
+  return (CONFIG_CACHE_VERSION, tuple(sources))
+
+
+def _load_config_cache(sources):
+  try:
+    with open(config_cache_path, 'rb') as f:
+      cached_sources, config_file_path, config = pickle.load(f)
+  except Exception: # missing, unreadable, or written by an incompatible version
+    return None
+  if cached_sources != sources:
+    return None
+  return (config_file_path, config)
+
+
+def _store_config_cache(sources, config_file_path, config):
+  temporary_path = config_cache_path.with_name(f'{config_cache_path.name}.{os.getpid()}')
+  try:
+    config_cache_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(temporary_path, 'wb') as f:
+      pickle.dump((sources, config_file_path, config), f, pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary_path, config_cache_path) # concurrent launches never see a partial cache
+  except OSError: # read-only config home, the cache is only an optimization
+    try:              os.unlink(temporary_path)
+    except OSError:   pass
+
+
+def read_user_config_file(extra_config_file_path=None, use_cache=True):
+  """Return the path of the config file in effect and the typed config, with the style section
+  built into Style objects. The result is cached under the config home and reused until any of the
+  candidate config files changes, so a warm start never imports or runs ConfigParser."""
+  if not use_cache:
+    config_file_path, config = _parse_user_config_file(extra_config_file_path)
+    return (config_file_path, _build_styles(config))
+  sources = _config_sources(extra_config_file_path)
+  if (cached := _load_config_cache(sources)) is not None:
+    return cached
+  config_file_path, config = _parse_user_config_file(extra_config_file_path)
+  config = _build_styles(config)
+  _store_config_cache(sources, config_file_path, config)
+  return (config_file_path, config)
+
+
 __all__ = [
   read_user_config_file,
   package_directory,
   package_name,
   default_config_path,
   user_config_file_paths,
+  config_cache_path,
   default_config
 ]
\ No newline at end of file
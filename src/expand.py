@@ -0,0 +1,118 @@
+import os, stat
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from . import export
+
+
+class SelectionExpander():
+  """Expands the selected directories of a selection into the files beneath them at output time.
+  Directories are read by a pool of threads, up to lookahead of them ahead of the output at each
+  level, while paths are yielded in selection order, files before subdirectories and each sorted
+  by name, so the output is deterministic and streams as soon as the subtrees before it finish.
+  Directories deeper than max_depth beneath a selected one are output as they are. Symlinked
+  directories are output as links unless follow_symlinks. A directory reached twice, e.g. through
+  a symlink loop, is expanded once, and with dedup so is a file reached through several hard or
+  symbolic links. A path that cannot be stat'ed, e.g. a file removed since it was selected, is
+  output as it is. Unreadable directories are skipped and collected in errors."""
+
+  def __init__(self, max_depth=None, follow_symlinks=False, dedup=False, workers=None):
+    self.max_depth       = max_depth
+    self.follow_symlinks = follow_symlinks
+    self.dedup           = dedup
+    self.workers         = workers or min(32, (os.cpu_count() or 1) + 4)
+    self.lookahead       = 2 * self.workers
+    self.errors          = [] # (path, error message) of directories that could not be read
+    self.executor        = None
+
+
+  def iter_paths(self, path_prefix, selection):
+    """Yield the selected paths of selection with the selected directories expanded"""
+    self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix='SelectionExpander')
+    try:
+      yield from self._iter_paths(export.iter_selection_paths(path_prefix, selection))
+    finally: # also when the reader stops early
+      self.executor.shutdown(cancel_futures=True)
+
+
+  def _iter_paths(self, paths):
+    directories, files = set(), set()
+    stack = [ self.prefetch( (path, 0) for path in paths ) ]
+    while stack:
+      for path, depth, future in stack[-1]:
+        if future is None: # at max_depth
+          yield path
+          continue
+        result = future.result()
+        if result is None: continue # unreadable
+        key, listing = result
+        if listing is None:
+          if self.unseen(files, key): yield path
+          continue
+        if key in directories: continue
+        directories.add(key)
+        names, subdirectories = listing
+        for name, file_key in names:
+          if self.unseen(files, file_key): yield f'{path}/{name}'
+        if subdirectories:
+          stack.append(self.prefetch( (f'{path}/{name}', depth + 1) for name in subdirectories ))
+          break
+      else:
+        stack.pop()
+
+
+  def unseen(self, files, key):
+    if not self.dedup or key is None: return True
+    if key in files: return False
+    files.add(key)
+    return True
+
+
+  def prefetch(self, items):
+    """Yield (path, depth, future of read()) for items, keeping up to lookahead reads in flight"""
+    pending = deque()
+    for path, depth in items:
+      limited = self.max_depth is not None and depth >= self.max_depth
+      pending.append((path, depth, None if limited else self.executor.submit(self.read, path)))
+      if len(pending) > self.lookahead:
+        yield pending.popleft()
+    while pending:
+      yield pending.popleft()
+
+
+  def read(self, path):
+    """The (device, inode) of path and, if it is a directory, its sorted (name, file key) pairs
+    and subdirectory names, or None if it is a directory that cannot be read"""
+    try:
+      st = os.stat(path) if self.follow_symlinks else os.lstat(path)
+    except OSError: # not known to be a directory, so output as selected
+      return None, None
+    if not stat.S_ISDIR(st.st_mode):
+      return (st.st_dev, st.st_ino), None
+    names, subdirectories = [], []
+    try:
+      with os.scandir(path) as iterator:
+        for direntry in iterator:
+          try:            is_dir = direntry.is_dir(follow_symlinks=self.follow_symlinks)
+          except OSError: is_dir = False
+          if is_dir: subdirectories.append(direntry.name)
+          else:      names.append((direntry.name, self.file_key(direntry, st.st_dev)))
+    except OSError as error:
+      self.errors.append((path, error.strerror or str(error)))
+      return None
+    names.sort()
+    subdirectories.sort()
+    return (st.st_dev, st.st_ino), (names, subdirectories)
+
+
+  def file_key(self, direntry, device):
+    if not self.dedup: return None
+    if self.follow_symlinks and direntry.is_symlink():
+      try:            st = direntry.stat()
+      except OSError: return None # dangling
+      return (st.st_dev, st.st_ino)
+    return (device, direntry.inode()) # the inode comes with the listing, no stat needed
+
+
+  def selection_dict(self, path_prefix, selection):
+    """The nested selection dict of the expanded selection"""
+    return export.paths_dict(self.iter_paths(path_prefix, selection), path_prefix)
@@ -0,0 +1,66 @@
+import os
+from itertools import chain, islice
+
+
+def selection_items(selection: dict):
+  """Iterator over the items of a plain dict or a SelectionTree, reading the bulk of a SelectionTree
+  in place"""
+  items = iter(dict.items(selection))
+  if getattr(selection, 'bulk', None) is None: return items
+  return chain(items, selection.bulk_items())
+
+
+def iter_selection_paths(path_prefix: str, selection: dict):
+  """Yield the selected paths of a nested selection dict depth first. Iterative, so neither deep
+  nesting nor the number of paths builds up anything but one (prefix, items iterator) pair per open
+  directory."""
+  stack = [(path_prefix, selection_items(selection))]
+  while stack:
+    prefix, items = stack[-1]
+    for k,v in items:
+      if v is True:
+        yield f"{prefix}/{k}"
+      elif isinstance(v, dict):
+        stack.append((f"{prefix}/{k}", selection_items(v)))
+        break
+    else:
+      stack.pop()
+
+
+def write_selection_paths(file, path_prefix: str, selection: dict, separator='\n', chunk_paths=4096):
+  """Write every selected path followed by separator to the binary file, encoding paths as the
+  filesystem does and writing chunk_paths paths at a time"""
+  write_paths(file, iter_selection_paths(path_prefix, selection), separator, chunk_paths)
+
+
+def write_paths(file, paths, separator='\n', chunk_paths=4096):
+  """Write every path of the iterable paths followed by separator to the binary file, chunk_paths
+  paths at a time"""
+  paths = iter(paths)
+  while (chunk := list(islice(paths, chunk_paths))):
+    chunk.append('')
+    file.write(os.fsencode(separator.join(chunk)))
+
+
+def selection_dict(selection: dict):
+  """The nested selection as plain dicts, without directories that have nothing selected"""
+  true_selection = {}
+  for k,v in selection_items(selection):
+    if v is True:
+      true_selection[k] = v
+    elif isinstance(v, dict):
+      if v:
+        true_selection[k] = selection_dict(v)
+  return true_selection
+
+
+def paths_dict(paths, path_prefix=''):
+  """The nested selection dict of paths, which all start with path_prefix followed by '/'"""
+  root = {}
+  for path in paths:
+    *parents, name = path[len(path_prefix) + 1:].split('/')
+    node = root
+    for parent in parents:
+      node = node.setdefault(parent, {})
+    node[name] = True
+  return root
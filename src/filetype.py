@@ -8,5 +8,16 @@ StatMask2FileType = {
     0xc000: "socket",
 }
 
+def mode_filetype(st_mode):
+    return StatMask2FileType.get(st_mode & 0xf000, 'file')
+
 def filetype(pathobj):
-    return StatMask2FileType.get(pathobj.lstat().st_mode & 0xf000, 'file')
\ No newline at end of file
+    return mode_filetype(pathobj.lstat().st_mode)
+
+def direntry_filetype(direntry):
+    """Resolve the type of an os.DirEntry from its cached d_type, only falling back to lstat() for
+    special files (devices, fifos, sockets) and filesystems that do not report d_type"""
+    if direntry.is_dir(follow_symlinks=False):  return "directory"
+    if direntry.is_file(follow_symlinks=False): return "file"
+    if direntry.is_symlink():                   return "symlink"
+    return mode_filetype(direntry.stat(follow_symlinks=False).st_mode)
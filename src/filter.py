@@ -0,0 +1,125 @@
+from itertools import compress, count, repeat
+from operator import add, ge, itemgetter, not_, sub
+
+
+class FilterLevel():
+  """The candidates matching one query. For every candidate it keeps where the leftmost subsequence
+  match of the query starts and ends, so the next character only needs one str.find per candidate."""
+  __slots__ = ('query', 'ignore_case', 'entries', 'names', 'lowered', 'starts', 'ends', 'results')
+
+
+  def __init__(self, query, ignore_case, entries, names, lowered, starts, ends, results):
+    self.query       = query
+    self.ignore_case = ignore_case
+    self.entries     = entries
+    self.names       = names
+    self.lowered     = lowered
+    self.starts      = starts
+    self.ends        = ends
+    self.results     = results
+
+
+class PathFilter():
+  """Narrow a list of entries down to those whose name contains the typed query, either as a
+  substring or as a fuzzy subsequence. Substring matches are listed first in their original order,
+  then fuzzy matches by how tightly they match. Every added character only rescans the candidates
+  left by the previous query, and each step is kept on a stack so backspace costs nothing."""
+
+  def __init__(self, entries, key=lambda entry: entry.name):
+    self.key   = key
+    self.stack = [self.base_level(list(entries))] # a copy, the caller may extend entries in place
+
+
+  def base_level(self, entries):
+    names = list(map(self.key, entries))
+    return FilterLevel('', True, entries, names, list(map(str.lower, names)), None, None, entries)
+
+
+  @property
+  def query(self):
+    return self.stack[-1].query
+
+
+  @property
+  def results(self):
+    return self.stack[-1].results
+
+
+  def __len__(self):
+    return len(self.results)
+
+
+  @staticmethod
+  def advance(level, query, ignore_case):
+    """Match the candidates of level, which matched query[:-1], against query. Every loop runs in C
+    (map, compress, sorted) so a keystroke over 100k names stays within a frame."""
+    c        = query[-1]
+    haystack = level.lowered if ignore_case else level.names
+    if level.ends is None:
+      found  = list(map(str.find, haystack, repeat(c)))
+      starts = found
+    else:
+      found  = list(map(str.find, haystack, repeat(c), level.ends))
+      starts = level.starts
+    selectors = list(map(ge, found, repeat(0)))
+    entries   = list(compress(level.entries, selectors))
+    names     = list(compress(level.names,   selectors))
+    lowered   = list(compress(level.lowered, selectors))
+    starts    = list(compress(starts,        selectors))
+    ends      = list(map(add, compress(found, selectors), repeat(1)))
+    if len(query) == 1:
+      results = entries
+    else:
+      haystack  = lowered if ignore_case else names
+      substring = list(map(str.__contains__, haystack, repeat(query)))
+      fuzzy     = sorted(compress( zip(map(sub, ends, starts), starts, count(), entries),
+                                   map(not_, substring) ))
+      results   = list(compress(entries, substring)) + list(map(itemgetter(3), fuzzy))
+    return FilterLevel(query, ignore_case, entries, names, lowered, starts, ends, results)
+
+
+  def rematch(self, level, query, ignore_case):
+    """Match level against every prefix of query, e.g. when the recorded match positions are for
+    the other case"""
+    for end in range(1, len(query) + 1):
+      level = self.advance(level, query[:end], ignore_case)
+    return level
+
+
+  def push(self, chars):
+    for c in chars:
+      query       = self.query + c
+      ignore_case = query == query.lower() # smartcase: any uppercase in the query matches case
+      level       = self.stack[-1]
+      if level.query and level.ignore_case != ignore_case:
+        self.stack.append(self.rematch(self.stack[0], query, ignore_case))
+      else:
+        self.stack.append(self.advance(level, query, ignore_case))
+    return self
+
+
+  def pop(self):
+    if len(self.stack) > 1:
+      self.stack.pop()
+    return self
+
+
+  def extend(self, entries):
+    """Add entries which arrived after the filter was created, e.g. from a streamed listing. Their
+    matches are appended to every level in arrival order."""
+    new = self.base_level(entries)
+    for level in self.stack:
+      if level.query and new.query and new.ignore_case != level.ignore_case:
+        new = self.rematch(self.base_level(entries), level.query, level.ignore_case)
+      elif level.query:
+        new = self.advance(new, level.query, level.ignore_case)
+      for attr in ('entries', 'names', 'lowered', 'starts', 'ends', 'results'):
+        old = getattr(level, attr)
+        if old is not None:
+          setattr(level, attr, old + getattr(new, attr))
+    return self
+
+
+  def rebase(self, entries):
+    """The same query applied to a fresh listing"""
+    return PathFilter(entries, self.key).push(self.query)
@@ -0,0 +1,119 @@
+import json, os
+from concurrent.futures import ThreadPoolExecutor
+
+
+def read_path_list(file, chunk_size=1 << 16):
+  """Yield the paths of a newline or NUL separated list read from a binary file in chunks. The list
+  is NUL separated if the first chunk contains a NUL, like the output of find -print0 or -0."""
+  separator, rest = None, b''
+  while (chunk := file.read(chunk_size)):
+    if separator is None:
+      separator = b'\0' if b'\0' in chunk else b'\n'
+    lines = (rest + chunk).split(separator)
+    rest  = lines.pop()
+    yield from map(os.fsdecode, filter(None, lines))
+  if rest.strip(b'\n'):
+    yield os.fsdecode(rest)
+
+
+def load_json_selection(file_or_string):
+  """The nested selection dict of a --load-json argument, either a JSON file or a JSON string"""
+  if os.path.isfile(file_or_string):
+    with open(file_or_string) as f:
+      return json.load(f)
+  return json.loads(file_or_string)
+
+
+class SelectionImporter():
+  """Merge selections from path lists and nested dicts into a SelectionTree, dropping entries which
+  no longer exist. Entries are grouped by directory first, so each directory is checked once, with
+  a single os.scandir pass (or a few lstat calls for a handful of names), on a thread pool."""
+  scandir_threshold = 32 # fewer names than this in a directory are checked with lstat instead
+
+
+  def __init__(self, root, workers=None):
+    self.root    = os.fspath(root)
+    self.workers = workers or min(32, (os.cpu_count() or 1) + 4)
+    self.groups  = {} # tuple of directory names relative to root -> entry names
+    self.dropped = [] # paths which are outside root or do not exist
+    self.imported = 0
+
+
+  def relative(self, path):
+    """path relative to root, or None if it is not beneath root"""
+    relative = os.path.relpath(path, self.root)
+    if relative == os.curdir or relative == os.pardir or relative.startswith(os.pardir + os.sep):
+      return None
+    return relative
+
+
+  def add_path(self, path):
+    relative = self.relative(os.path.abspath(path))
+    if relative is None: # maybe reached through a symlink, resolve the directory part only
+      head, tail = os.path.split(os.path.abspath(path))
+      relative   = self.relative(os.path.join(os.path.realpath(head), tail))
+    if relative is None:
+      self.dropped.append(os.fspath(path))
+      return
+    *directories, name = relative.split(os.sep)
+    self.groups.setdefault(tuple(directories), []).append(name)
+
+
+  def add_paths(self, paths):
+    for path in paths:
+      self.add_path(path)
+    return self
+
+
+  def add_dict(self, selection, directories=()):
+    """Add a nested selection dict relative to root, e.g. the output of --json"""
+    names = [ name for name, value in selection.items() if value is True ]
+    if names:
+      self.groups.setdefault(directories, []).extend(names)
+    for name, value in selection.items():
+      if isinstance(value, dict):
+        self.add_dict(value, (*directories, name))
+    return self
+
+
+  def check(self, directories, names):
+    """Split names into those that exist in the directory and those that do not"""
+    directory = os.path.join(self.root, *directories)
+    if len(names) < self.scandir_threshold:
+      existing = set()
+      for name in names:
+        try:
+          os.lstat(os.path.join(directory, name))
+          existing.add(name)
+        except OSError:
+          pass
+    else:
+      try:
+        with os.scandir(directory) as iterator:
+          existing = { direntry.name for direntry in iterator }
+      except OSError: # the directory itself is gone
+        existing = set()
+    return [ name for name in names if name in existing ], [ name for name in names if name not in existing ]
+
+
+  def merge_into(self, tree):
+    """Check every group and select the existing entries in tree. Returns tree."""
+    groups = list(self.groups.items())
+    with ThreadPoolExecutor(self.workers) as executor:
+      checked = executor.map(lambda group: self.check(*group), groups)
+      for (directories, _), (existing, missing) in zip(groups, checked):
+        directory = os.path.join(self.root, *directories)
+        self.dropped.extend( os.path.join(directory, name) for name in missing )
+        if not existing: continue
+        if any( tree.lookup(directories[:depth]) is True for depth in range(1, len(directories) + 1) ):
+          self.imported += len(existing) # already covered by a selected parent directory
+          continue
+        node = tree.descendant(directories)
+        if len(existing) < self.scandir_threshold:
+          for name in existing:
+            node.select(name)
+        else:
+          node.select_all(existing)
+        self.imported += len(existing)
+    self.groups = {}
+    return tree
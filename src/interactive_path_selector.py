@@ -1,15 +1,26 @@
-import pathlib
+import pathlib, time
+from . import export
 from .style import Style
-from .filetype import filetype
+from .display_width import display_width, take_left, take_right
+from .filetype import StatMask2FileType
+from .listing import ListingCache, ListingStream, name_key, bisect_key
+from .sorting import SortOrder
+from .watch import make_watcher, PollingWatcher, OVERFLOW
+from .selection import SelectionTree
+from .filter import PathFilter
+from .search import SearchIndex
+from .usage import SelectionUsage, format_size
+from .preview import Previewer
 from .interactive_terminal_application import *
 
 
 @singleton
 class InteractivePathSelector(InteractiveTerminalApplication):
   header_message = None
-  selection      = {}
-  subselection   = selection
+  selection      = None
+  subselection   = None
   path_list      = []
+  path_list_unfiltered = []
   path_list_last = 0
   path_list_len  = 0
   index      = 0
@@ -21,7 +32,24 @@ class InteractivePathSelector(InteractiveTerminalApplication):
   page_start = 0
   page_end   = 0
   page_info  = ''
+  stream     = None
+  watcher    = None
+  filter     = None
+  filter_typing = False
+  search     = None
+  usage      = None
+  preview    = None # Previewer while the preview pane is shown
+  preview_wanted = None # path of the entry the preview pane should show
+  preview_lines  = []   # plain text lines of the shown preview
+  preview_rows   = None # (width, styled lines) the preview lines were last rendered as
+  sorter     = sorted # passed to sort_path_list, e.g. replaced by a timed sort when profiling
   style      = {}
+  row_styles = {}
+  selection_states = ('unselected', 'selected', 'nested_selected')
+  sort_mode_descriptions = { 'plain':    'by name',
+                             'casefold': 'by name, ignoring case',
+                             'natural':  'naturally, file2 before file10',
+                             'version':  'by version, 1.0rc1 before 1.0' }
 
 
   @staticmethod
@@ -38,31 +66,25 @@ class InteractivePathSelector(InteractiveTerminalApplication):
     return [p for p in it if not p.name.startswith('.')]
 
 
-  @staticmethod
-  def _sort_path_list(path_list):
-    return sorted(path_list)
-
-
-  @staticmethod
-  def _sort_path_list_directories_first(path_list):
-    dirs  = [ d for d in path_list if d.is_dir() ]
-    files = [ f for f in path_list if not f.is_dir() ]
-    return sorted(dirs) + sorted(files)
-
-
   def __init__( self,
                 root        = None,
                 show_hidden = False,
                 dirs_first  = False,
-                style       = {} ):
-    super().__init__()
+                sort        = 'plain',
+                style       = {},
+                listing_cache_size = 100000,
+                stream_threshold   = 20000,
+                watch              = False,
+                selection_usage    = False,
+                preview            = False,
+                tty                = None ):
+    super().__init__(tty)
 
     if not style:
       from .config import default_config
       style = default_config['style']
 
-    for k, v in style.items():
-      self.style[k] = Style(**v)
+    self.load_style(style)
 
     if root and root != '.':
       root = pathlib.Path(root).expanduser().resolve()
@@ -78,65 +100,169 @@ class InteractivePathSelector(InteractiveTerminalApplication):
     else:
       self.iter2paths = self._iter2paths_no_hidden
 
-    if dirs_first:
-      self.sort_path_list = self._sort_path_list_directories_first
-    else:
-      self.sort_path_list = self._sort_path_list
+    self.sort_path_list = SortOrder.get(sort, dirs_first)
 
     self.index = 0
     self.root = root
     self.cwd = root
+    self.clear_selection()
+    self.listing_cache = ListingCache(listing_cache_size)
+    self.stream_threshold = stream_threshold
+    self.input_handler = self.dispatch_key
+    self.search_indexes = {} # show_hidden -> SearchIndex of everything beneath root
+    if selection_usage:
+      self.usage = SelectionUsage(self.post_usage_progress)
+    if preview:
+      self.preview = Previewer(self.post_preview)
+    if watch:
+      self.watcher = make_watcher(self.post_changes)
     self.ls()
-
-    self.input_action_map = {
-         'Q  ': lambda: self.end(throw=True),
-         'q  ': lambda: self.end(throw=True),
-         'k  ': self.row_up,
-         'j  ': self.row_down,
-         'l  ': self.select_or_descend,
-         'h  ': self.ascend,
-         '   ': self.toggle_selected,
-        '\t  ': self.toggle_selected,
-        '\n  ': lambda: False,                # enter key
-      '\033  ': lambda: self.end(throw=True), # escape
+    if self.watcher is not None:
+      self.watcher.start()
+
+    self.input_action_map = {                # keys as decoded by KeyDecoder
+           'Q': lambda: self.end(throw=True),
+           'q': lambda: self.end(throw=True),
+           'k': self.row_up,
+           'j': self.row_down,
+           'l': self.select_or_descend,
+           'h': self.ascend,
+           '/': self.start_filter,
+           's': self.cycle_sort_mode,
+           'p': self.toggle_preview,
+           ' ': self.toggle_selected,
+          '\t': self.toggle_selected,
+          '\n': lambda: False,                # enter key
+        '\033': self.escape,                  # escape
       '\033[A': self.row_up,                  # up
       '\033[B': self.row_down,                # down
       '\033[C': self.select_or_descend,       # right
       '\033[D': self.ascend,                  # left
-      '\033[5': self.page_up,                 # pageup
-      '\033[6': self.page_down,               # pagedown
-      '\x01  ': self.toggle_all_selected,    # ctrl-a
-      '\x04  ': self.toggle_show_dirs_first,  # ctrl-d
-      '\x08  ': self.toggle_show_hidden,      # ctrl-h
-      '\x12  ': self.refresh_manual,          # ctrl-r
+      '\033OA': self.row_up,                  # up, application cursor mode
+      '\033OB': self.row_down,                # down, application cursor mode
+      '\033OC': self.select_or_descend,       # right, application cursor mode
+      '\033OD': self.ascend,                  # left, application cursor mode
+     '\033[5~': self.page_up,                 # pageup
+     '\033[6~': self.page_down,               # pagedown
+        '\x01': self.toggle_all_selected,     # ctrl-a
+        '\x04': self.toggle_show_dirs_first,  # ctrl-d
+        '\x06': self.start_search,            # ctrl-f
+        '\x08': self.toggle_show_hidden,      # ctrl-h
+        '\x12': self.refresh_manual,          # ctrl-r
     }
 
 
-  def read_key(self):
-    event  = os.read(self.fd, 3).ljust(3).decode()
-    return_value = self.input_action_map.get(event, self._noop)()
+  def load_style(self, style):
+    for k, v in style.items():
+      self.style[k] = v if isinstance(v, Style) else Style(**v) # built already by a cached config
+    if 'preview' not in self.style: # a user config from before the preview pane
+      from .config import default_config
+      self.style['preview'] = Style(**default_config['style']['preview'])
+    self.row_styles = self.compose_row_styles()
+
+
+  def compose_row_styles(self):
+    """Precompose the row Style for every (filetype, selection state, active) combination so
+    draw_row only needs a dict lookup"""
+    row_styles = {}
+    for _filetype in set(StatMask2FileType.values()):
+      for selection_state in self.selection_states:
+        for active, cursor_state in ((True, 'active'), (False, 'inactive')):
+          row_style = Style()
+          for name in (_filetype, selection_state, cursor_state):
+            if name in self.style:
+              row_style.apply(self.style[name])
+          row_style.reset = True
+          row_style.update_template()
+          row_styles[_filetype, selection_state, active] = row_style
+    return row_styles
+
+
+  def handle_key(self, key):
+    return self.handle_keys([key])
+
+
+  def handle_keys(self, keys):
+    """Handle a batch of keys which arrived together. Each run of movement keys, e.g. from a held
+    down j or pagedown, is collapsed into a single cursor move, and the batch is flushed once."""
+    return_value = None
+    index = None # where the current run of movement keys leaves the cursor
+    for key in keys:
+      step = self.key_motion(key)
+      if step is not None:
+        index = step(self.index if index is None else index)
+        continue
+      if index is not None:
+        self.move_cursor(index)
+        index = None
+      return_value = self.input_handler(key)
+      if return_value is False: break
+    if index is not None:
+      self.move_cursor(index)
+    if self.preview is not None:
+      self.update_preview()
+    self.flush()
     if return_value is not None:
       return return_value
     return True
 
 
+  def key_motion(self, key):
+    """The cursor movement of key under the current input handler, as a function from the cursor
+    index to the new index, or None if key is not a movement key"""
+    if self.filter_typing and not key.startswith('\033'): return None
+    action = self.input_action_map.get(key)
+    last   = self.path_list_last
+    height = self.HEIGHT_1
+    if action == self.row_down:  return lambda index: index + 1 if index < last else 0
+    if action == self.row_up:    return lambda index: index - 1 if index > 0 else last
+    if action == self.page_down: return lambda index: min(index + height, last)
+    if action == self.page_up:   return lambda index: max(index - height, 0)
+    return None
+
+
+  def dispatch_key(self, key):
+    return self.input_action_map.get(key, self._noop)()
+
+
+  def filter_key(self, key):
+    """Input handler while a filter query is typed: printable keys edit the query, Enter keeps the
+    filter, Escape drops it, and everything else (arrows, ctrl keys) works as usual"""
+    if key == '\n':
+      self.stop_filter(keep=True)
+    elif key == '\033':
+      self.stop_filter(keep=False)
+    elif key in ('\x7f', '\x08'): # backspace
+      if self.filter.query:
+        self.filter.pop()
+        self.update_filter()
+      else:
+        self.stop_filter(keep=False)
+    elif key.isprintable():
+      self.filter.push(key)
+      self.update_filter()
+    else:
+      return self.dispatch_key(key)
+
+
   def resize(self, *args):
     super().resize()
     self.draw_page()
+    self.flush()
 
 
   def truncate_right_to_width(self, s, width):
-    if len(s) > width:
+    if display_width(s) > width:
       truncated = self.style['truncated']
-      return s[:width-truncated.suffix_length] + truncated.suffix
+      return take_left(s, width - truncated.suffix_length) + truncated.suffix
     else:
       return s
 
 
   def truncate_left_to_width(self, s, width):
-    if len(s) > width:
+    if display_width(s) > width:
       truncated = self.style['truncated']
-      return truncated.prefix + s[-width+truncated.prefix_length:]
+      return truncated.prefix + take_right(s, width - truncated.prefix_length)
     else:
       return s
 
@@ -147,13 +273,155 @@ class InteractivePathSelector(InteractiveTerminalApplication):
     except IndexError: return None
 
 
-  def ls(self):
-    self.path_list      = self.sort_path_list(  self.iter2paths( self.cwd.iterdir() )  )
+  def path_list_find(self, name, default=0):
+    for index, path in enumerate(self.path_list):
+      if path.name == name: return index
+    return default
+
+
+  def set_path_list(self, path_list):
+    self.path_list      = path_list
     self.path_list_len  = max(len(self.path_list), 0)
     self.path_list_last = max(self.path_list_len - 1, 0)
     self.path_list_any  = self.path_list_len > 0
 
 
+  def set_listing(self, path_list):
+    """Show a new listing of the current directory, through the filter if one is active"""
+    self.path_list_unfiltered = path_list
+    if self.filter is not None:
+      self.filter = self.filter.rebase(path_list)
+      self.set_path_list(self.filter.results)
+    else:
+      self.set_path_list(path_list)
+
+
+  def ls(self, force=False):
+    if self.watcher is not None:
+      try:
+        self.watcher.watch(self.cwd)
+      except OSError as error:
+        self.poll_instead_of_watching(error)
+    stream = self.stream
+    if stream is not None and not force and stream.path == self.cwd: # re-filter what has streamed in so far
+      self.stream_seen = len(stream.listing.entries)
+      self.set_listing(self.iter2paths(stream.listing.entries[:self.stream_seen]))
+      return
+    self.stop_stream()
+    listing = self.listing_cache.get(self.cwd, force, self.stream_threshold)
+    if listing.complete:
+      self.set_listing(listing.view(self.iter2paths, self.sort_path_list, self.sorter))
+    else:
+      self.start_stream(listing)
+
+
+  def start_stream(self, listing):
+    """Show the entries of a huge directory in readdir order while a ListingStream reads and sorts
+    the rest in the background"""
+    self.stream = ListingStream( self.cwd,
+                                 listing,
+                                 self.iter2paths,
+                                 self.sort_path_list,
+                                 on_progress = self.post_stream_progress,
+                                 on_done     = lambda stream: self.post(self.stream_done, stream) )
+    self.stream_seen = len(listing.entries)
+    self.set_listing(self.iter2paths(listing.entries))
+    self.stream.start()
+
+
+  def stop_stream(self):
+    if self.stream is not None:
+      self.stream.cancel()
+      self.stream = None
+
+
+  def post_stream_progress(self, stream):  # called from the ListingStream thread
+    if not stream.progress_posted:         # coalesce progress while the UI thread is busy
+      stream.progress_posted = True
+      self.post(self.stream_progress, stream)
+
+
+  def stream_progress(self, stream):
+    if stream is not self.stream: return
+    stream.progress_posted = False
+    entries = stream.listing.entries
+    seen, self.stream_seen = self.stream_seen, len(entries)
+    self.extend_listing(self.iter2paths(entries[seen:self.stream_seen]))
+
+
+  def extend_listing(self, added):
+    """Append entries which arrived in the background to the shown listing"""
+    page_was_full = self.page_end - self.page_start >= self.HEIGHT_1
+    self.path_list_unfiltered.extend(added)
+    if self.filter is not None:
+      self.set_path_list(self.filter.extend(added).results)
+    else:
+      self.set_path_list(self.path_list_unfiltered)
+    if page_was_full:
+      self.draw_header_info()
+    else:
+      self.draw_page()
+
+
+  def stream_done(self, stream):
+    if stream is not self.stream: return
+    self.stream = None
+    self.listing_cache.store(stream.path, stream.listing)
+    active_element = self.path_list_get()
+    self.set_listing(stream.listing.view(self.iter2paths, self.sort_path_list))
+    try:               self.index = self.path_list.index(active_element)
+    except ValueError: pass
+    self.draw_page()
+
+
+  def path_list_key(self):
+    return self.sort_path_list.key
+
+
+  def poll_instead_of_watching(self, error):
+    """Replace a watcher which cannot watch the current directory by a PollingWatcher"""
+    started = self.watcher.is_alive()
+    self.watcher.close()
+    self.watcher = PollingWatcher(self.post_changes)
+    self.watcher.watch(self.cwd)
+    if started:
+      self.watcher.start()
+    self.post(self.draw_header_alert, f"Cannot watch {self.cwd} ({error.strerror}), polling it instead")
+
+
+  def post_changes(self, path, names): # called from the watcher thread
+    self.post(self.apply_changes, path, names)
+
+
+  def apply_changes(self, path, names):
+    """Patch the current listing in place after the watcher reported changes to the named entries"""
+    if path != str(self.cwd) or self.stream is not None or self.search is not None: return
+    listing = self.listing_cache.peek(path)
+    if ( names is OVERFLOW or listing is None
+         or listing.views.get((self.iter2paths, self.sort_path_list)) is not self.path_list_unfiltered ):
+      self.refresh(force=True)
+      return
+    key    = self.path_list_key()
+    active = self.path_list_get()
+    size   = len(listing.entries)
+    listing.update(path, names, self.iter2paths, self.sort_path_list, key)
+    try:
+      listing.mtime_ns = os.stat(path).st_mtime_ns
+      listing.racy     = time.time_ns() - listing.mtime_ns < self.listing_cache.RACY_NS
+    except OSError:
+      listing.racy     = True
+    self.listing_cache.update_size(listing, size)
+    self.set_listing(self.path_list_unfiltered)
+    if active is not None and active.name in names: # e.g. replaced by a rename over it
+      self.preview_wanted = None
+    if active is not None and self.filter is not None:
+      self.index = self.path_list_find(active.name, self.index)
+    elif active is not None: # keep the cursor on the same entry, or on its successor if it was removed
+      active = listing.by_name.get(active.name, active)
+      self.index = bisect_key(self.path_list, key(active), key)
+    self.draw_page()
+
+
   def paginate(self):
     if self.index > self.path_list_last:
       self.index = 0
@@ -170,79 +438,167 @@ class InteractivePathSelector(InteractiveTerminalApplication):
 
 
   def draw_header(self, message):
-    self.save_cursor_xy()
-    self.cursor_home()
-    self.clear_line()
-    self.puts(message)
-    self.restore_cursor_xy()
+    self.draw_line(0, message)
 
 
   def draw_header_info(self):
     _style    = self.style['header']
-    row_info  = f"   {self.index + self.path_list_any}/{self.path_list_len}{self.page_info}"
-    width     = self.WIDTH - len(row_info) - _style.length
-    path      = self.truncate_left_to_width(str(self.cwd), width)
-    gap       = ' ' * (width - len(path))
+    streaming = '+' if self.stream is not None or (self.search is not None and not self.search.done) else ''
+    query     = f"   /{self.filter.query}{'_' if self.filter_typing else ''}" if self.filter is not None else ''
+    row_info  = f"{self.selection_usage_info()}{query}   {self.index + self.path_list_any}/{self.path_list_len}{streaming}{self.page_info}"
+    width     = self.WIDTH - display_width(row_info) - _style.length
+    location  = str(self.cwd) if self.search is None else f"{self.root}/**"
+    path      = self.truncate_left_to_width(location, width)
+    gap       = ' ' * (width - display_width(path))
     self.draw_header(_style.format(f"{path}{gap}{row_info}"))
 
 
+  def selection_usage_info(self):
+    """Total size and file count of the selection, + while some of it is still being measured"""
+    if self.usage is None or self.selection.count == 0: return ''
+    size, files, pending = self.usage.totals(self.selection, str(self.root))
+    return f"   {format_size(size)} in {files} file{'' if files == 1 else 's'}{'+' if pending else ''}"
+
+
+  def post_usage_progress(self, usage): # called from the SelectionUsage workers
+    self.post(self.usage_progress, usage)
+
+
+  def usage_progress(self, usage):
+    if usage.apply_results():
+      self.draw_header_info()
+
+
   def draw_header_alert(self, message):
     _style  = self.style['header']
     width   = self.WIDTH - _style.length
-    message = self.truncate_left_to_width(message, width).center(width)
+    message = self.truncate_left_to_width(message, width)
+    margin  = width - display_width(message)
+    message = ' ' * (margin // 2) + message + ' ' * (margin - margin // 2)
     self.draw_header(_style.format(message))
     
     
-  def draw_row(self, index=None, active=False):
-    if index is None: index = self.index
+  def format_row(self, index, active=False):
     path = self.path_list_get(index)
-    if path is None: return
+    if path is None: return ''
     path_name = path.name
 
-    selected = self.subselection.get(path_name, False)
-    row_style = Style()
-    row_style.apply(self.style[filetype(path)])
+    selected = self.selection_get(path_name)
 
-    # if isinstance(selected, dict) and True in selected.values():
-    if isinstance(selected, dict) and selected:
-      row_style.apply(self.style['nested_selected'])
-    elif selected:
-      row_style.apply(self.style['selected'])
+    if selected is True:
+      selection_state = 'selected'
+    elif selected is not None and selected.count:
+      selection_state = 'nested_selected'
     else:
-      row_style.apply(self.style['unselected'])
-      
-    if active:
-      row_style.apply(self.style['active'])
-    else:
-      row_style.apply(self.style['inactive'])
+      selection_state = 'unselected'
 
-    row_style.reset = True
-    row_style.update_template()
-    width = self.WIDTH - row_style.length
+    row_style = self.row_styles[path.filetype, selection_state, active]
+    width = self.list_width - row_style.length
     text = self.truncate_right_to_width(path_name, width)
-    text = row_style.format(text)
+    if self.preview is not None: # pad the row up to the preview pane
+      return row_style.format(text) + ' ' * (width - display_width(text))
+    return row_style.format(text)
+
 
-    self.clear_line()
-    self.puts(text)
+  def draw_row(self, index=None, active=False):
+    if index is None: index = self.index
+    if self.page_start <= index < self.page_end:
+      y = index - self.page_start + 1
+      self.draw_line(y, self.format_row(index, active) + self.preview_row(y))
 
 
   def draw_cursor(self):
-    self.cursor_xy(0, self.row)
-    self.clear_line()
     self.draw_row(active=True)
-    self.cursor_x(0)
 
 
   def draw_page(self):
     self.paginate()
-    self.cursor_home()
-    self.clear_screen()
     self.draw_header_info()
-    self.cursor_home()
-    for i in range(self.page_start, self.page_end):
-      self.puts('\n')
-      self.draw_row(i)
-    self.draw_cursor()
+    for y in range(1, self.HEIGHT):
+      index = self.page_start + y - 1
+      if index < self.page_end:
+        self.draw_line(y, self.format_row(index, active = index == self.index) + self.preview_row(y))
+      elif self.preview is not None:
+        self.draw_line(y, ' ' * self.list_width + self.preview_row(y))
+      else:
+        self.draw_line(y, '')
+
+
+  @property
+  def list_width(self):
+    return self.WIDTH if self.preview is None else (self.WIDTH + 1) // 2
+
+
+  def preview_row(self, y):
+    """The preview pane's part of screen line y, next to the listing"""
+    if self.preview is None: return ''
+    width = self.WIDTH - self.list_width
+    if self.preview_rows is None or self.preview_rows[0] != width:
+      _style = self.style['preview']
+      self.preview_rows = (width, [ _style.format(self.truncate_right_to_width(line, width - _style.length))
+                                    for line in self.preview_lines[:self.HEIGHT] ])
+    rows = self.preview_rows[1]
+    return rows[y - 1] if y <= len(rows) else self.style['preview'].format('')
+
+
+  def update_preview(self):
+    """Show the preview of the entry under the cursor, at once if it is cached, else once a worker
+    has loaded it, meanwhile leaving the previous preview in place"""
+    entry = self.path_list_get(self.index)
+    path  = entry.path if entry is not None else None
+    if path == self.preview_wanted: return
+    self.preview_wanted = path
+    lines = [] if entry is None else self.preview.get(entry)
+    if lines is not None:
+      self.show_preview(lines)
+
+
+  def run_posted(self):
+    super().run_posted()
+    if self.preview is not None: # background work, e.g. the watcher or a search, may have moved the cursor
+      self.update_preview()
+
+
+  def post_preview(self, path, lines, stamp): # called from the Previewer workers
+    self.post(self.preview_ready, path, lines, stamp)
+
+
+  def preview_ready(self, path, lines, stamp):
+    if self.preview is None: return
+    self.preview.store(path, lines, stamp)
+    if path == self.preview_wanted:
+      self.show_preview(lines)
+
+
+  def show_preview(self, lines):
+    self.preview_lines = lines
+    self.preview_rows  = None
+    self.draw_page()
+
+
+  def toggle_preview(self):
+    if self.preview is None:
+      self.preview = Previewer(self.post_preview)
+      message = "Preview shown"
+    else:
+      self.preview.close()
+      self.preview = None
+      message = "Preview hidden"
+    self.preview_wanted, self.preview_lines, self.preview_rows = None, [], None
+    self.draw_page()
+    self.draw_header_alert(message)
+
+
+  def move_cursor(self, index):
+    if index == self.index: return
+    self.draw_row()
+    self.index = index
+    if self.page_start <= index < self.page_end:
+      self.row = index - self.page_start + 2
+      self.draw_header_info()
+      self.draw_cursor()
+    else:
+      self.draw_page()
 
 
   def row_up(self):
@@ -279,41 +635,107 @@ class InteractivePathSelector(InteractiveTerminalApplication):
     self.draw_page()
 
 
-  def refresh(self):
+  def refresh(self, force=False):
+    if self.search is not None: # walk root again, e.g. with hidden files
+      if force: self.cancel_search_indexes()
+      self.start_search(self.filter.query if self.filter is not None else '')
+      return
     active_element = self.path_list_get()
-    self.ls()
-    try: self.index = self.path_list.index(active_element)
-    except ValueError: pass
+    self.ls(force)
+    if active_element is not None:
+      self.index = self.path_list_find(active_element.name, self.index)
     self.draw_page()
 
 
   def refresh_manual(self):
-    self.refresh()
+    if self.usage is not None:
+      self.usage.clear()
+    if self.preview is not None:
+      self.preview.clear()
+      self.preview_wanted = None
+    self.refresh(force=True)
     self.draw_header_alert("Directory listing refreshed")
 
 
+  def cancel_search_indexes(self):
+    """Stop the walks of the SearchIndexes and drop them, their threads are not left running"""
+    for index in self.search_indexes.values():
+      index.cancel()
+    self.search_indexes.clear()
+
+
+  def close(self):
+    self.stop_stream()
+    self.cancel_search_indexes()
+    if self.usage is not None:
+      self.usage.close()
+    if self.preview is not None:
+      self.preview.close()
+    if self.watcher is not None:
+      self.watcher.close()
+    super().close()
+
+
+  def clear_selection(self):
+    self.selection    = SelectionTree()
+    self.subselection = self.selection
+
+
+  def selection_get(self, name):
+    """The selection value of a shown entry, whose name is a path relative to root while searching"""
+    if self.search is None:
+      return self.subselection.get(name)
+    return self.selection.lookup(name.split('/'))
+
+
+  def selection_node(self, name):
+    """The SelectionTree holding a shown entry, and the entry's name within it"""
+    if self.search is None:
+      return self.subselection, name
+    *directories, name = name.split('/')
+    return self.selection.descendant(directories), name
+
+
   def toggle_selected(self):
-    path = self.path_list_get(self.index).name
+    path = self.path_list_get(self.index)
     if path is None: return
-    if self.subselection.get(path, False):
-      del self.subselection[path]
-    else:
-      self.subselection[path] = True
+    node, name = self.selection_node(path.name)
+    node.toggle(name)
+    if self.usage is not None:
+      self.draw_header_info()
     self.draw_cursor()
 
 
-  def toggle_all_selected(self): # TO-DO del unselect
-    all_selected = all(self.subselection.get(path.name, False) for path in self.path_list)
-    if all_selected:
+  def all_selected(self):
+    if self.filter is not None or self.search is not None:
+      return all( self.selection_get(name) is True for name in map(name_key, self.path_list) )
+    show_hidden = self.iter2paths is self._iter2paths_with_hidden
+    if self.subselection.selected_count(show_hidden) < self.path_list_len: return False
+    # enough selections, but some may be of names which have since left the listing
+    return all( self.selection_get(name) is True for name in map(name_key, self.path_list) )
+
+
+  def toggle_all_selected(self):
+    if self.all_selected():
       message ="All deselected"
-      # for key in self.subselection.keys():
-        # del self.subselection[key]
-      self.subselection.clear()
+      if self.search is not None:
+        for name in map(name_key, self.path_list):
+          node, name = self.selection_node(name)
+          node.deselect(name)
+      elif self.filter is not None: # only the entries matching the filter
+        for name in map(name_key, self.path_list):
+          self.subselection.deselect(name)
+      else:
+        self.subselection.clear()
+    elif self.search is not None:
+      message = "All selected"
+      for name in map(name_key, self.path_list):
+        node, name = self.selection_node(name)
+        node.select(name)
     else:
       message = "All selected"
-      for path in self.path_list:
-        self.subselection[path.name] = True
-    self.refresh()
+      self.subselection.select_all(map(name_key, self.path_list))
+    self.draw_page()
     self.draw_header_alert(message)
 
 
@@ -329,30 +751,130 @@ class InteractivePathSelector(InteractiveTerminalApplication):
 
 
   def toggle_show_dirs_first(self):
-    if self.sort_path_list is self._sort_path_list:
-      self.sort_path_list = self._sort_path_list_directories_first
+    if not self.sort_path_list.dirs_first:
+      self.sort_path_list = self.sort_path_list.with_dirs_first(True)
       message = "Directories listed first"
     else:
-      self.sort_path_list = self._sort_path_list
-      message = "All listed alphabetically"
+      self.sort_path_list = self.sort_path_list.with_dirs_first(False)
+      message = f"All listed {self.sort_mode_descriptions[self.sort_path_list.mode]}"
     self.refresh()
     self.draw_header_alert(message)
 
 
+  def cycle_sort_mode(self):
+    self.sort_path_list = self.sort_path_list.next_mode()
+    self.refresh()
+    self.draw_header_alert(f"Sorted {self.sort_mode_descriptions[self.sort_path_list.mode]}")
+
+
+  def start_filter(self):
+    if self.filter is None:
+      self.filter = PathFilter(self.path_list_unfiltered)
+    self.filter_typing = True
+    self.input_handler = self.filter_key
+    self.draw_header_info()
+
+
+  def update_filter(self):
+    self.set_path_list(self.filter.results)
+    self.index = 0 # the best match
+    self.draw_page()
+
+
+  def stop_filter(self, keep=True):
+    self.filter_typing = False
+    self.input_handler = self.dispatch_key
+    if keep and self.filter.query:
+      self.draw_header_info()
+      return
+    active = self.path_list_get()
+    self.filter = None
+    self.set_path_list(self.path_list_unfiltered)
+    try:               self.index = self.path_list.index(active)
+    except ValueError: self.index = 0
+    self.draw_page()
+
+
+  def clear_filter(self):
+    self.filter = None
+    self.filter_typing = False
+    self.input_handler = self.dispatch_key
+
+
+  def start_search(self, query=''):
+    """Filter everything beneath root instead of the current directory. The first search walks the
+    tree in the background while its entries are shown, later ones reuse the SearchIndex."""
+    show_hidden = self.iter2paths is self._iter2paths_with_hidden
+    index = self.search_indexes.get(show_hidden)
+    if index is None:
+      index = self.search_indexes[show_hidden] = SearchIndex(
+        self.root,
+        show_hidden,
+        on_progress = self.post_search_progress,
+        on_done     = lambda index: self.post(self.search_progress, index) ).start()
+    if self.search is None:
+      self.search_return = self.path_list_get() # the entry to return to in the current directory
+    self.stop_stream()
+    self.clear_filter()
+    self.search      = index
+    self.search_seen = len(index.entries)
+    self.path_list_unfiltered = index.entries[:self.search_seen]
+    self.filter        = PathFilter(self.path_list_unfiltered).push(query)
+    self.filter_typing = True
+    self.input_handler = self.filter_key
+    self.update_filter()
+
+
+  def post_search_progress(self, index): # called from the SearchIndex threads
+    if not index.progress_posted:
+      index.progress_posted = True
+      self.post(self.search_progress, index)
+
+
+  def search_progress(self, index):
+    if index is not self.search: return
+    index.progress_posted = False
+    seen, self.search_seen = self.search_seen, len(index.entries)
+    self.extend_listing(index.entries[seen:self.search_seen])
+
+
+  def stop_search(self):
+    active = self.search_return
+    self.search = None
+    names, node = [], self.subselection
+    while node.parent is not None:
+      names.append(node.name)
+      node = node.parent
+    if node is not self.selection: # a directory above the current one was toggled while searching
+      self.subselection = self.selection.descendant(reversed(names))
+    self.clear_filter()
+    self.ls()
+    self.index = self.path_list_find(active.name) if active is not None else 0
+    self.draw_page()
+
+
+  def escape(self):
+    if self.filter is not None:
+      self.stop_filter(keep=False)
+    elif self.search is not None:
+      self.stop_search()
+    else:
+      self.end(throw=True)
+
+
   def ascend(self):
     parent = self.cwd.parent
-    if parent.is_relative_to(self.root):
-      key_hierarchy = parent.relative_to(self.root).parts
-      subselection = self.selection
-      for key in key_hierarchy:   # recurse from root to nesting n-1 to go up 1
-        subselection = subselection[key]
-      if not subselection.get(self.cwd.name, True):
-        del subselection[self.cwd.name]
+    if self.search is not None:
+      self.stop_search()
+    elif parent.is_relative_to(self.root):
+      self.clear_filter()
+      subselection = self.subselection.parent
+      subselection.prune(self.subselection.name)
       self.subselection = subselection
       cwd = self.cwd
       self.cwd = parent
       self.ls()
-      self.index = self.path_list.index(cwd)
+      self.index = self.path_list_find(cwd.name)
       self.draw_page()
     else:
       self.draw_header_alert(f"Cannot ascend past root")
@@ -360,16 +882,13 @@ class InteractivePathSelector(InteractiveTerminalApplication):
 
   def descend(self):
     newdir = self.path_list_get(self.index)
-    newdirname = newdir.name
-    cwd = self.cwd
-    self.cwd = newdir.resolve()
+    node, newdirname = self.selection_node(newdir.name) # a search result may be anywhere beneath root
+    self.search = None
+    self.cwd = pathlib.Path(newdir.path).resolve()
+    self.clear_filter()
     self.ls()
     self.index = 0
-    subselection = self.subselection.get(newdirname, None)
-    if not isinstance(subselection, dict):
-      self.subselection[newdirname] = {}
-      subselection = self.subselection[newdirname]
-    self.subselection = subselection
+    self.subselection = node.child(newdirname)
     self.draw_page()
     if not self.path_list_any:
       self.draw_header_alert(f"{newdirname} is empty")
@@ -378,35 +897,38 @@ class InteractivePathSelector(InteractiveTerminalApplication):
   def select_or_descend(self):
     path = self.path_list_get(self.index)
     if path is None: return
-    if path.is_dir(): self.descend()
+    if path.is_dir: self.descend()
     else: self.toggle_selected()
 
 
+  @staticmethod
+  def _iter_nested_dict_path_strings(path_prefix: str, selection: dict):
+    return export.iter_selection_paths(path_prefix, selection)
+
+
   @classmethod
   def _nested_dict_to_path_strings(cls, path_prefix: str, selection: dict):
-    paths = []
-    for k,v in selection.items():
-      if v is True:
-        paths.append(f"{path_prefix}/{k}")
-      elif isinstance(v, dict):
-        paths += cls._nested_dict_to_path_strings(f"{path_prefix}/{k}", v)
-    return paths
+    return list(cls._iter_nested_dict_path_strings(path_prefix, selection))
+
+
+  def iter_selection_paths(self, expander=None):
+    """The selected paths, with selected directories expanded into their files by a SelectionExpander"""
+    if expander is not None:
+      return expander.iter_paths(str(self.root), self.selection)
+    return self._iter_nested_dict_path_strings(str(self.root), self.selection)
+
+
+  def get_selection_paths(self, expander=None):
+    return list(self.iter_selection_paths(expander))
 
 
-  def get_selection_paths(self):
-    return self._nested_dict_to_path_strings(str(self.root), self.selection)
+  def write_selection_paths(self, file, separator='\n', chunk_paths=4096):
+    export.write_selection_paths(file, str(self.root), self.selection, separator, chunk_paths)
 
 
   @classmethod
   def _nested_dict_to_path_dict(cls, selection: dict):
-    true_selection = {}
-    for k,v in selection.items():
-      if v is True:
-        true_selection[k] = v
-      elif isinstance(v, dict):
-        if v:
-          true_selection[k] = cls._nested_dict_to_path_dict(v)
-    return true_selection
+    return export.selection_dict(selection)
 
 
   def get_selection_dict(self):
@@ -1,4 +1,6 @@
-import atexit, sys, os, signal, io, fcntl, termios, struct, shutil
+import atexit, sys, os, signal, io, fcntl, termios, struct, shutil, select, asyncio
+from collections import deque
+from .keys import KeyDecoder
 
 """
 https://invisible-island.net/xterm/ctlseqs/ctlseqs.html
@@ -14,11 +16,16 @@ def singleton(cls):
 
 class InteractiveTerminalApplication():
   fd, stty = None, None
+  wakeup_r, wakeup_w = None, None
+  loop, stopped = None, None # event loop and its result future while run() is running
   WIDTH, HEIGHT = 80, 25
   HEIGHT_1 = 24  # cache HEIGHT - 1 for graphical calculations
+  FRAME_BUFFER_SIZE = 1 << 16
+  ESCAPE_DELAY = 0.025 # seconds to wait for the rest of an escape sequence before taking ESC as a key
 
 
   def get_terminal_size(self):
+    terminal_size = None
     try: terminal_size = struct.unpack('hh', fcntl.ioctl(self.fd, termios.TIOCGWINSZ, '1234'))
     except: pass
     if not terminal_size:
@@ -28,21 +35,168 @@ class InteractiveTerminalApplication():
   
 
   def puts(self, s):
-    self.tty.write(s)
+    self.frame.append(s)
+
+
+  def flush(self):
+    """Emit everything queued by puts() since the last flush as a single write to the tty"""
+    if self.frame:
+      self.tty.write(''.join(self.frame))
+      self.frame.clear()
     self.tty.flush()
-    
-  
+
+
   def resize(self, *args):
     self.HEIGHT, self.WIDTH = self.get_terminal_size()
     self.HEIGHT_1 = self.HEIGHT - 1
+    self.clear_screen()
+    self.reset_screen()
+
+
+  def reset_screen(self):
+    """Forget what is on screen, i.e. assume every line is blank"""
+    self.screen   = [''] * self.HEIGHT # text last emitted on each screen line
+    self.screen_y = None               # screen line the terminal cursor was left on
+
+
+  def draw_line(self, y, text):
+    """Show text on screen line y (0 is the top line), emitting nothing if the line already shows it"""
+    if not 0 <= y < len(self.screen) or self.screen[y] == text: return
+    if self.screen_y == y - 1:
+      self.puts('\n')
+    else:
+      self.cursor_y(y + 1)
+    self.clear_line()
+    self.puts(text)
+    self.screen[y] = text
+    self.screen_y  = y
+
+
+  def post(self, callback, *args):
+    """Queue callback(*args) to run on the UI thread. Safe to call from background threads."""
+    if self.wakeup_w is None: return # application already closed
+    self.posted.append((callback, args))
+    try:    os.write(self.wakeup_w, b'\0')
+    except BlockingIOError: pass # pipe is full, so a wakeup is already pending
+
+
+  def run_posted(self):
+    try:    os.read(self.wakeup_r, 4096)
+    except BlockingIOError: pass
+    while self.posted:
+      callback, args = self.posted.popleft()
+      callback(*args)
+
+
+  def read_keys(self):
+    """Decode everything the terminal has buffered into key events. Only the first read may block,
+    so keys which queued up while the last batch was handled are all returned at once."""
+    data = os.read(self.fd, 4096)
+    while data and select.select([self.fd], [], [], 0)[0]:
+      more = os.read(self.fd, 4096)
+      if not more: break
+      data += more
+    keys = self.key_decoder.feed(data)
+    if self.key_decoder.pending and not select.select([self.fd], [], [], self.ESCAPE_DELAY)[0]:
+      keys += self.key_decoder.flush()
+    return keys
+
+
+  def handle_keys(self, keys):
+    """Handle a batch of keys from read_keys(), returning False to end the input loop"""
+    return True
+
+
+  def read_key(self):
+    """Synchronous input loop step: block until input arrives and handle it"""
+    self.wait_input()
+    return self.handle_keys(self.read_keys())
+
+
+  def post_resize(self, *args): # SIGWINCH handler
+    self.post(self.resize)
+
+
+  def run(self):
+    """Handle input until a handler ends the loop, on an asyncio event loop which also runs
+    posted callbacks and resizes. Returns the handler's final return value."""
+    result = asyncio.run(self.run_async())
+    if isinstance(result, BaseException): # e.g. KeyboardInterrupt from end(throw=True)
+      raise result
+    return result
 
 
-  def __init__(self):
+  async def run_async(self):
+    self.loop    = asyncio.get_running_loop()
+    self.stopped = self.loop.create_future()
+    fd, wakeup_r = self.fd, self.wakeup_r # end() closes them while handling input
+    self.loop.add_reader(fd, self.guarded, self.on_input)
+    self.loop.add_reader(wakeup_r, self.guarded, self.on_wakeup)
+    self.loop.add_signal_handler(signal.SIGWINCH, self.guarded, self.resize)
+    try:
+      return await self.stopped
+    finally:
+      self.loop.remove_reader(fd)
+      self.loop.remove_reader(wakeup_r)
+      self.loop.remove_signal_handler(signal.SIGWINCH)
+      if self.wakeup_r is not None: # still running, restore the synchronous resize handling
+        signal.signal(signal.SIGWINCH, self.post_resize)
+      self.loop = self.stopped = None
+
+
+  def stop(self, result=False):
+    """End run() with result, e.g. from a posted callback"""
+    if self.stopped is not None and not self.stopped.done():
+      self.stopped.set_result(result)
+
+
+  def guarded(self, callback):
+    """Call a loop callback, ending run() with any exception it raises instead of letting the event
+    loop log and swallow it"""
+    try:
+      callback()
+    except BaseException as exception:
+      self.stop(exception)
+
+
+  def on_input(self):
+    if not self.handle_keys(self.read_keys()):
+      self.stop(False)
+
+
+  def on_wakeup(self):
+    self.run_posted()
+    self.flush()
+
+
+  def wait_input(self):
+    """Block until the tty has input to read, running callbacks posted by background work meanwhile"""
+    while True:
+      ready, _, _ = select.select([self.fd, self.wakeup_r], [], [])
+      if self.wakeup_r in ready:
+        self.run_posted()
+        self.flush()
+      if self.fd in ready:
+        return
+
+
+  def __init__(self, tty=None):
     """Open a different FD for TUI stdout so this application can be piped or captured to a shell
-    variables without disrupting the TUI graphics and passing garbage ANSI sequences elsewhere"""
-    self.fd   = os.open(os.ctermid(), os.O_NOCTTY | os.O_RDWR) # open file descriptor on controlling terminal
-    self.stty = termios.tcgetattr(self.fd)  # save current TTY settings
-    self.tty  = io.TextIOWrapper(io.FileIO(self.fd, 'w')) # open tty as a file-like for printing
+    variables without disrupting the TUI graphics and passing garbage ANSI sequences elsewhere.
+    tty defaults to the controlling terminal; a non-terminal such as /dev/null is used as is, e.g.
+    for benchmarks."""
+    self.fd   = os.open(tty or os.ctermid(), os.O_NOCTTY | os.O_RDWR) # open file descriptor on controlling terminal
+    try:    self.stty = termios.tcgetattr(self.fd)  # save current TTY settings
+    except termios.error: self.stty = None          # not a terminal
+    self.tty  = io.TextIOWrapper( io.BufferedWriter( io.FileIO(self.fd, 'w'),  # open tty as a file-like for printing
+                                                     self.FRAME_BUFFER_SIZE ) )
+    self.frame = [] # output queued by puts() until the next flush()
+    self.posted = deque() # callbacks queued by post() for the UI thread
+    self.key_decoder = KeyDecoder()
+    self.wakeup_r, self.wakeup_w = os.pipe() # self-pipe to interrupt wait_input() when posting
+    os.set_blocking(self.wakeup_r, False)
+    os.set_blocking(self.wakeup_w, False)
+    self.reset_screen()
     
 
   def cursor_home(self):           self.puts('\033[0H')
@@ -66,22 +220,36 @@ class InteractiveTerminalApplication():
   
 
   def close(self):
-    termios.tcsetattr(self.fd, termios.TCSADRAIN, self.stty) # restore saved TTY settings, e.g. echo & icanon
+    if self.stty is not None:
+      termios.tcsetattr(self.fd, termios.TCSADRAIN, self.stty) # restore saved TTY settings, e.g. echo & icanon
     self.show_cursor()
     # self.clear_screen()
     self.primary_screen()
     try:
+      self.flush()
       sys.stderr.flush()
       sys.stdout.flush()
-      self.tty.flush()
       self.tty.close()
     except BrokenPipeError: pass
+    os.close(self.wakeup_r)
+    os.close(self.wakeup_w)
+    self.wakeup_r = self.wakeup_w = None
 
 
   def launch(self):
     """ Manual terminal graphics init """
-    # See `man termios` for flag information
     atexit.register(self.close) # in case an unexpected exit occurs, restore the terminal back to its starting state
+    if self.stty is not None:
+      self.set_raw_mode()
+    self.hide_cursor()
+    self.alt_screen()
+    signal.signal(signal.SIGWINCH, self.post_resize) # resized from the input loop, not inside the handler
+    self.resize()
+    self.flush()
+
+
+  def set_raw_mode(self):
+    # See `man termios` for flag information
     new = termios.tcgetattr(self.fd)       #
 
     # `& ~()` disables flags, `|()` enables flags
@@ -102,19 +270,15 @@ class InteractiveTerminalApplication():
     termios.tcsetattr( self.fd,
                        termios.TCSADRAIN,
                        [iflag, oflag, cflag, lflag, ispeed, ospeed, cc] )
-    self.hide_cursor()
-    self.alt_screen()
-    self.clear_screen()
-    signal.signal(signal.SIGWINCH, self.resize)
-    self.resize()
 
 
   def end(self, *args, throw=False):
     atexit.unregister(self.close) # prevent duplicate execution of terminal restore
     self.close()
     signal.signal(signal.SIGWINCH, signal.SIG_DFL) # remove signal handler
-    self.end      = lambda: None
+    self.end      = lambda *args, **kwargs: None
     self.close    = lambda: None
+    self.flush    = lambda: None
     self.launch   = lambda: None
     self.__exit__ = lambda: None
     if throw:
@@ -0,0 +1,52 @@
+import codecs
+
+
+class KeyDecoder():
+  """Split raw terminal input into key events: CSI sequences (ESC [ parameters final), SS3 sequences
+  (ESC O x), alt+key (ESC x), a lone ESC, and single characters. Input is decoded as UTF-8
+  incrementally. An escape sequence cut off at the end of a read, including a lone ESC which may
+  start one, is held back in pending until the next feed() or until flush() gives up waiting."""
+
+  def __init__(self):
+    self.decoder = codecs.getincrementaldecoder('utf-8')('replace')
+    self.pending = ''
+
+
+  def feed(self, data):
+    text  = self.pending + self.decoder.decode(data)
+    keys  = []
+    i, n  = 0, len(text)
+    while i < n:
+      c = text[i]
+      if c != '\033':
+        keys.append(c)
+        i += 1
+        continue
+      if i + 1 == n: break # incomplete
+      c = text[i+1]
+      if c == '[':
+        end = i + 2
+        while end < n and not '\x40' <= text[end] <= '\x7e': # parameter and intermediate bytes
+          end += 1
+        if end == n: break # incomplete
+        keys.append(text[i:end+1])
+        i = end + 1
+      elif c == 'O':
+        if i + 2 == n: break # incomplete
+        keys.append(text[i:i+3])
+        i += 3
+      elif c == '\033':      # escape pressed twice
+        keys.append(c)
+        i += 1
+      else:                  # alt+key
+        keys.append(text[i:i+2])
+        i += 2
+    self.pending = text[i:]
+    return keys
+
+
+  def flush(self):
+    """Give up waiting for the rest of a pending escape sequence, returning its characters as keys,
+    e.g. a lone ESC when the escape key itself was pressed"""
+    keys, self.pending = list(self.pending), ''
+    return keys
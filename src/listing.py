@@ -0,0 +1,298 @@
+import os, time, heapq, threading
+from collections import OrderedDict
+from itertools import islice
+from .filetype import StatMask2FileType, direntry_filetype, mode_filetype
+
+
+class PathEntry():
+  """A directory listing entry whose type information is captured once at listing time so
+  sorting, drawing and descending never need to stat the path again"""
+  __slots__ = ('name', 'path', 'filetype', 'is_dir', 'sort_keys')
+
+
+  def __init__(self, name, path, filetype, is_dir):
+    self.name      = name
+    self.path      = path
+    self.filetype  = filetype
+    self.is_dir    = is_dir # follows symlinks, i.e. whether this entry can be descended into
+    self.sort_keys = None   # sort mode -> name key, memoized by SortOrder
+
+
+  @classmethod
+  def from_direntry(cls, direntry):
+    try:
+      _filetype = direntry_filetype(direntry)
+    except OSError:  # entry vanished between readdir and lstat
+      _filetype = 'file'
+    if _filetype == 'symlink':
+      try:            is_dir = direntry.is_dir()
+      except OSError: is_dir = False
+    else:
+      is_dir = _filetype == 'directory'
+    return cls(direntry.name, direntry.path, _filetype, is_dir)
+
+
+  @classmethod
+  def from_name(cls, directory, name):
+    path      = os.path.join(directory, name)
+    _filetype = mode_filetype(os.lstat(path).st_mode)
+    if _filetype == 'symlink':
+      is_dir = os.path.isdir(path)
+    else:
+      is_dir = _filetype == 'directory'
+    return cls(name, path, _filetype, is_dir)
+
+
+  def __fspath__(self):
+    return self.path
+
+
+  def __repr__(self):
+    return f"{self.__class__.__name__}({self.path!r}, {self.filetype})"
+
+
+def scandir(path, iter_filter=list):
+  """List path with a single os.scandir pass, filtering the raw DirEntry iterator with iter_filter
+  before any PathEntry (and potential lstat) is created"""
+  with os.scandir(path) as it:
+    return list(map(PathEntry.from_direntry, iter_filter(it)))
+
+
+def sorted_incrementally(iterable, key=None, chunk_size=1 << 15):
+  """sorted() for background threads. A single list.sort() holds the GIL until it completes, which
+  would freeze the UI thread for seconds on millions of entries, so sort short chunks and merge
+  them with heapq.merge, which yields the GIL between items."""
+  items = list(iterable)
+  if len(items) <= chunk_size:
+    return sorted(items, key=key)
+  chunks = [ sorted(items[i:i+chunk_size], key=key) for i in range(0, len(items), chunk_size) ]
+  return list(heapq.merge(*chunks, key=key))
+
+
+def name_key(entry):
+  return entry.name
+
+
+def directories_first_key(entry):
+  return (not entry.is_dir, entry.name)
+
+
+def bisect_key(a, x, key):
+  """bisect.bisect_left(a, x, key=key), which needs python 3.10"""
+  lo, hi = 0, len(a)
+  while lo < hi:
+    mid = (lo + hi) // 2
+    if key(a[mid]) < x: lo = mid + 1
+    else:               hi = mid
+  return lo
+
+
+class Listing():
+  __slots__ = ('entries', 'mtime_ns', 'racy', 'views', 'pending', 'by_name')
+
+
+  def __init__(self, entries, mtime_ns, racy=False, pending=None):
+    self.entries  = entries  # every entry in the directory, hidden or not, in readdir order
+    self.mtime_ns = mtime_ns # directory st_mtime_ns sampled before reading it
+    self.racy     = racy     # directory was modified too recently for mtime to prove freshness
+    self.views    = {}       # (iter_filter, sort) -> filtered and sorted entries
+    self.pending  = pending  # open scandir iterator while the listing is still being streamed
+    self.by_name  = None     # name -> entry, built on the first update()
+
+
+  @property
+  def complete(self):
+    return self.pending is None
+
+
+  def view(self, iter_filter, sort, sorter=sorted):
+    try:
+      return self.views[iter_filter, sort]
+    except KeyError:
+      view = self.views[iter_filter, sort] = sort(iter_filter(self.entries), sorter)
+      return view
+
+
+  def update(self, directory, names, iter_filter, sort, key):
+    """Re-stat names after a change notification and patch the entries and the (iter_filter, sort)
+    view, which must be sorted by key, in place. Other views are dropped."""
+    view = self.view(iter_filter, sort)
+    self.views = {(iter_filter, sort): view}
+    if self.by_name is None:
+      self.by_name = { entry.name: entry for entry in self.entries }
+    removed = False
+    for name in names:
+      old = self.by_name.pop(name, None)
+      if old is not None:
+        removed = True
+        if iter_filter([old]):
+          index = bisect_key(view, key(old), key)
+          if index < len(view) and view[index] is old:
+            del view[index]
+      try:
+        new = PathEntry.from_name(directory, name)
+      except OSError:
+        continue
+      self.by_name[name] = new
+      self.entries.append(new)
+      if iter_filter([new]):
+        view.insert(bisect_key(view, key(new), key), new)
+    if removed: # entries are in readdir order, so they are filtered once per batch rather than per name
+      by_name = self.by_name
+      self.entries[:] = [ entry for entry in self.entries if by_name.get(entry.name) is entry ]
+
+
+class ListingStream(threading.Thread):
+  """Finish reading an incomplete Listing in the background. on_progress(stream) is called from this
+  thread whenever another batch of entries has been appended to listing.entries, and on_done(stream)
+  once the directory is exhausted and the (iter_filter, sort) view has been sorted."""
+
+  def __init__(self, path, listing, iter_filter, sort, on_progress, on_done, batch_size=4096):
+    super().__init__(daemon=True)
+    self.path        = path
+    self.listing     = listing
+    self.iter_filter = iter_filter
+    self.sort        = sort
+    self.on_progress = on_progress
+    self.on_done     = on_done
+    self.batch_size  = batch_size
+    self.cancelled   = False
+    self.progress_posted = False # lets on_progress coalesce notifications the consumer has not handled yet
+
+
+  def cancel(self):
+    self.cancelled = True
+
+
+  def run(self):
+    listing = self.listing
+    entries = listing.entries
+    batch   = []
+    with listing.pending as iterator:
+      for direntry in iterator:
+        if self.cancelled: return
+        batch.append(PathEntry.from_direntry(direntry))
+        if len(batch) >= self.batch_size:
+          entries.extend(batch)
+          batch = []
+          self.on_progress(self)
+      entries.extend(batch)
+    listing.pending = None
+    if self.cancelled: return
+    self.on_progress(self)
+    listing.view(self.iter_filter, self.sort, sorted_incrementally)
+    if self.cancelled: return
+    self.on_done(self)
+
+
+class ListingCache():
+  """LRU cache of directory listings keyed by resolved directory path. A cached listing is reused
+  only while the directory's st_mtime_ns is unchanged, and listings are evicted least recently used
+  first once the total number of cached entries exceeds max_entries"""
+
+  # Filesystems with coarse timestamps can modify a directory twice within one mtime tick, so a
+  # listing taken this soon after the directory's last modification is always re-read.
+  RACY_NS = 2_000_000_000
+
+
+  def __init__(self, max_entries=100000):
+    self.listings    = OrderedDict()
+    self.max_entries = max_entries
+    self.size        = 0
+
+
+  def __len__(self):
+    return len(self.listings)
+
+
+  def __contains__(self, path):
+    return os.fspath(path) in self.listings
+
+
+  def discard(self, path):
+    listing = self.listings.pop(os.fspath(path), None)
+    if listing is not None:
+      self.size -= len(listing.entries)
+
+
+  def clear(self):
+    self.listings.clear()
+    self.size = 0
+
+
+  def store(self, path, listing):
+    key = os.fspath(path)
+    self.discard(key)
+    self.listings[key] = listing
+    self.size += len(listing.entries)
+    self.evict()
+
+
+  def get(self, path, force=False, stream_threshold=None):
+    """Return the listing of path, re-reading it if it is missing or stale. If stream_threshold is
+    given only that many entries are read before returning, and an incomplete listing, which is not
+    cached, is returned for a ListingStream to finish."""
+    key      = os.fspath(path)
+    mtime_ns = os.stat(key).st_mtime_ns
+    listing  = self.listings.get(key)
+    if not (force or listing is None or listing.racy or listing.mtime_ns != mtime_ns):
+      self.listings.move_to_end(key)
+      return listing
+    self.discard(key)
+    racy = time.time_ns() - mtime_ns < self.RACY_NS
+    if not stream_threshold:
+      listing = Listing(scandir(key), mtime_ns, racy)
+    else:
+      iterator = os.scandir(key)
+      entries  = list(map(PathEntry.from_direntry, islice(iterator, stream_threshold)))
+      if len(entries) < stream_threshold:
+        iterator.close()
+        listing = Listing(entries, mtime_ns, racy)
+      else:
+        return Listing(entries, mtime_ns, racy, pending=iterator)
+    self.store(key, listing)
+    return listing
+
+
+  def evict(self):
+    while self.size > self.max_entries and self.listings:
+      _, listing = self.listings.popitem(last=False)
+      self.size -= len(listing.entries)
+
+
+  def view(self, path, iter_filter, sort, force=False):
+    return self.get(path, force).view(iter_filter, sort)
+
+
+  def peek(self, path):
+    """The cached listing of path, if any, without validating it"""
+    return self.listings.get(os.fspath(path))
+
+
+  filetypes = tuple(StatMask2FileType.values()) # indexed by the type codes of dump()
+
+
+  def dump(self):
+    """The cached listings as plain data for a session snapshot, least recently used first. Each
+    entry is a name plus a byte encoding its file type and whether it is a directory. Racy listings
+    are left out, as they would be re-read anyway."""
+    code = { filetype: i << 1 for i, filetype in enumerate(self.filetypes) }
+    return [ ( path, listing.mtime_ns, [ entry.name for entry in listing.entries ],
+               bytes( code[entry.filetype] | entry.is_dir for entry in listing.entries ) )
+             for path, listing in self.listings.items() if not listing.racy ]
+
+
+  def load(self, dumped):
+    """Add listings from dump(). They are validated against their directory's mtime as usual the
+    first time they are used, so only directories changed since the dump are read again."""
+    filetypes, join = self.filetypes, os.path.join
+    for path, mtime_ns, names, codes in dumped:
+      entries = [ PathEntry(name, join(path, name), filetypes[code >> 1], bool(code & 1))
+                  for name, code in zip(names, codes) ]
+      self.store(path, Listing(entries, mtime_ns))
+
+
+  def update_size(self, listing, old_size):
+    """Account for a cached listing whose entries were patched in place"""
+    self.size += len(listing.entries) - old_size
+    self.evict()
@@ -0,0 +1,138 @@
+import mmap, os, stat, codecs, time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from .filetype import mode_filetype
+
+
+# C0 control characters and DEL, shown as '.' so file contents cannot drive the terminal
+printable = str.maketrans({ **{ c: '.' for c in range(32) }, 127: '.' })
+
+
+class Previewer():
+  """Loads the preview of a listing entry in a worker thread: the first lines of a text file, a hex
+  dump of a binary one, or a summary of a directory's children. Files are read through mmap and
+  never past max_bytes. A request the cursor has already moved away from is dropped before it is
+  read. Finished previews are kept in a small LRU cache keyed by path, so going back to an entry
+  shows it at once. A worker then revalidates it by the mtime and size of the path, like
+  ListingCache, and reloads it if it changed, so nothing is stat'ed on the UI thread.
+  on_ready(path, lines, stamp) is called from the worker; store() is for the UI thread."""
+
+  RACY_NS = 2_000_000_000 # as in ListingCache, a younger mtime does not prove the preview fresh
+
+  def __init__(self, on_ready=None, cache_size=64, max_bytes=4096, max_lines=256, workers=2):
+    self.on_ready   = on_ready or self._noop
+    self.cache      = OrderedDict() # path -> (stamp, lines)
+    self.cache_size = cache_size
+    self.max_bytes  = max_bytes
+    self.max_lines  = max_lines
+    self.wanted     = None # path of the latest request
+    self.executor   = ThreadPoolExecutor(workers, thread_name_prefix='Previewer')
+
+
+  @staticmethod
+  def _noop(path, lines, stamp): return
+
+
+  def close(self):
+    self.wanted = None
+    self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+  def clear(self):
+    self.cache.clear()
+
+
+  def get(self, entry):
+    """The cached preview lines of entry, to be revalidated by a worker, or None after requesting
+    them from a worker"""
+    self.wanted = entry.path
+    cached = self.cache.get(entry.path)
+    if cached is not None:
+      self.cache.move_to_end(entry.path)
+      self.executor.submit(self.load, entry.path, entry.is_dir, cached[0])
+      return cached[1]
+    self.executor.submit(self.load, entry.path, entry.is_dir)
+    return None
+
+
+  @classmethod
+  def stamp(cls, path, st=None):
+    """(mtime, size) of path, or None if it cannot be stated or changed too recently to trust"""
+    try:
+      if st is None: st = os.stat(path)
+    except OSError:
+      return None
+    if time.time_ns() - st.st_mtime_ns < cls.RACY_NS: return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+  def store(self, path, lines, stamp=None):
+    self.cache[path] = (stamp, lines)
+    self.cache.move_to_end(path)
+    while len(self.cache) > self.cache_size:
+      self.cache.popitem(last=False)
+
+
+  def load(self, path, is_dir, cached=None):
+    """Read the preview of path unless cached, the stamp of its cached preview, is still valid"""
+    if path != self.wanted: return # the cursor moved on while this request was queued
+    stamp = self.stamp(path) # before reading, so a change while reading is seen next time
+    if stamp is not None and stamp == cached: return
+    try:
+      lines = self.read_directory(path) if is_dir else self.read_file(path)
+    except OSError as error:
+      lines = [ error.strerror or str(error) ]
+    if lines is not None:
+      self.on_ready(path, lines, stamp)
+
+
+  def read_directory(self, path):
+    names, directories, total = [], 0, 0
+    with os.scandir(path) as iterator:
+      for direntry in iterator:
+        total += 1
+        try:    is_dir = direntry.is_dir()
+        except OSError: is_dir = False
+        directories += is_dir
+        if len(names) < self.max_lines:
+          names.append(direntry.name + '/' if is_dir else direntry.name)
+        elif not total & 0xfff and path != self.wanted:
+          return None # huge directory no longer under the cursor
+    summary = f"{total} {'entry' if total == 1 else 'entries'}: {directories} directories, {total - directories} files"
+    return [ summary, '', *sorted(names) ]
+
+
+  def read_file(self, path):
+    fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK) # a fifo must not block the worker
+    try:
+      st = os.fstat(fd)
+      if not stat.S_ISREG(st.st_mode):
+        return [ f"({mode_filetype(st.st_mode)})" ]
+      if st.st_size == 0:
+        return [ "(empty file)" ]
+      length = min(st.st_size, self.max_bytes)
+      with mmap.mmap(fd, length, access=mmap.ACCESS_READ) as mapped:
+        data = mapped[:length]
+    finally:
+      os.close(fd)
+    return self.format_text(data) or self.format_binary(data)
+
+
+  def format_text(self, data):
+    """Lines of data if it is UTF-8 text, allowing a character cut off at max_bytes, else None"""
+    if b'\0' in data: return None
+    try:
+      text = codecs.getincrementaldecoder('utf-8')().decode(data, final=False)
+    except UnicodeDecodeError:
+      return None
+    return [ line.expandtabs(4).translate(printable) for line in text.splitlines()[:self.max_lines] ]
+
+
+  def format_binary(self, data):
+    lines = []
+    for offset in range(0, min(len(data), 16 * self.max_lines), 16):
+      chunk = data[offset:offset + 16]
+      hexes = ' '.join( f'{byte:02x}' for byte in chunk )
+      chars = ''.join( chr(byte) if 32 <= byte < 127 else '.' for byte in chunk )
+      lines.append(f"{offset:08x}  {hexes:<47}  {chars}")
+    return lines
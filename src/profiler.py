@@ -0,0 +1,134 @@
+import sys, time
+from functools import wraps
+
+
+class Profiler():
+  """Per keystroke latency instrumentation for an InteractivePathSelector. Every handled batch of
+  keys records how long its actions took (including the flush) and how many bytes it wrote to the
+  tty, and the time spent listing, sorting and drawing is recorded separately. report() summarizes
+  the session with percentiles and a latency histogram. With cprofile_path a cProfile trace of the whole
+  session is dumped there as well, for use with pstats or snakeviz."""
+
+  # histogram bucket upper bounds in seconds, 16.7ms being one frame at 60Hz
+  buckets = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.0167, 0.05, 0.1, 0.25, 1.0, float('inf'))
+  phases  = ('ls', 'sort', 'draw_page')
+
+
+  def __init__(self, cprofile_path=None):
+    self.keys          = []  # (key, seconds, bytes written) per handled key
+    self.timings       = { phase: [] for phase in self.phases }
+    self.bytes_written = 0
+    self.cprofile_path = cprofile_path
+    self.cprofile      = None
+    self.start         = time.perf_counter()
+
+
+  def timed(self, phase, function):
+    timings = self.timings[phase]
+    @wraps(function)
+    def timed_function(*args, **kwargs):
+      start = time.perf_counter()
+      try:
+        return function(*args, **kwargs)
+      finally:
+        timings.append(time.perf_counter() - start)
+    return timed_function
+
+
+  def instrument(self, ips):
+    """Wrap the methods of ips worth timing with instance attributes"""
+    ips.ls        = self.timed('ls',        ips.ls)
+    ips.draw_page = self.timed('draw_page', ips.draw_page)
+    ips.sorter    = self.timed('sort',      ips.sorter)
+
+    flush = ips.flush
+    def counted_flush():
+      self.bytes_written += sum( len(s.encode()) for s in ips.frame )
+      flush()
+    ips.flush = counted_flush
+
+    handle_keys = ips.handle_keys
+    def timed_handle_keys(keys):
+      bytes_written = self.bytes_written
+      start = time.perf_counter()
+      try:
+        return handle_keys(keys)
+      finally:
+        self.keys.append((''.join(keys), time.perf_counter() - start, self.bytes_written - bytes_written))
+    ips.handle_keys = timed_handle_keys
+
+    if self.cprofile_path is not None:
+      import cProfile
+      self.cprofile = cProfile.Profile()
+      self.cprofile.enable()
+    return self
+
+
+  @staticmethod
+  def percentile(ordered, p):
+    """Nearest-rank percentile of an ordered list"""
+    if not ordered: return 0
+    return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered) + 0.5) - 1))]
+
+
+  @staticmethod
+  def format_seconds(seconds):
+    if seconds == float('inf'): return 'inf'
+    if seconds < 0.001:         return f'{seconds * 1e6:.0f}us'
+    if seconds < 1:             return f'{seconds * 1e3:.1f}ms'
+    return f'{seconds:.2f}s'
+
+
+  def summary_line(self, name, values, format_value):
+    ordered = sorted(values)
+    stats   = [ f'p{p}={format_value(self.percentile(ordered, p))}' for p in (50, 90, 99) ]
+    total   = format_value(sum(ordered))
+    maximum = format_value(ordered[-1] if ordered else 0)
+    return f'  {name:<12} n={len(ordered):<6} total={total:<9} {" ".join(stats)} max={maximum}'
+
+
+  def histogram(self, values, width=40):
+    counts = [0] * len(self.buckets)
+    for value in values:
+      counts[next( i for i, bound in enumerate(self.buckets) if value < bound )] += 1
+    most  = max(counts) or 1
+    lines = []
+    for bound, n in zip(self.buckets, counts):
+      lines.append(f'  < {self.format_seconds(bound):>7} {n:>6} {"#" * round(n / most * width)}'.rstrip())
+    return lines
+
+
+  def report(self, path=None):
+    """Write the session summary to path, or to stderr if path is None or '-'. Errors writing
+    either file are reported on stderr rather than raised, so the selection is still output."""
+    if self.cprofile is not None:
+      self.cprofile.disable()
+      try:
+        self.cprofile.dump_stats(self.cprofile_path)
+      except OSError as error:
+        sys.stderr.write(f'Could not write the cProfile trace to {self.cprofile_path}: {error}\n')
+    latencies = [ seconds for _, seconds, _ in self.keys ]
+    lines = [ f'pathpick profile: {len(self.keys)} keys in {time.perf_counter() - self.start:.2f}s, '
+              f'{self.bytes_written} bytes written to the tty',
+              'latency' ]
+    lines.append(self.summary_line('key', latencies, self.format_seconds))
+    for phase in self.phases:
+      lines.append(self.summary_line(phase, self.timings[phase], self.format_seconds))
+    lines.append('bytes written per key')
+    lines.append(self.summary_line('key', [ n for _, _, n in self.keys ], str))
+    lines.append('key latency histogram')
+    lines += self.histogram(latencies)
+    lines.append('slowest keys')
+    for key, seconds, n in sorted(self.keys, key=lambda record: record[1], reverse=True)[:5]:
+      lines.append(f'  {key!r:<12} {self.format_seconds(seconds):>9} {n:>8} bytes')
+    if self.cprofile is not None:
+      lines.append(f'cProfile trace written to {self.cprofile_path}')
+    text = '\n'.join(lines) + '\n'
+    if path is None or path == '-':
+      sys.stderr.write(text)
+      return
+    try:
+      with open(path, 'w') as f:
+        f.write(text)
+    except OSError as error:
+      sys.stderr.write(f'Could not write the profile to {path}: {error}\n{text}')
@@ -0,0 +1,98 @@
+import os, threading
+from concurrent.futures import ThreadPoolExecutor
+from .listing import PathEntry
+
+
+class SearchIndex():
+  """Every entry beneath root, named by its path relative to root. The tree is walked by a pool of
+  threads which each read one directory with a single os.scandir pass and queue its subdirectories.
+  Entries are appended as directories are read, so they can be shown while the walk is running, and
+  the finished index answers later queries without walking the filesystem again.
+  on_progress(index) and on_done(index) are called from the walker threads."""
+
+  def __init__(self, root, show_hidden=False, on_progress=None, on_done=None, workers=None):
+    self.root        = os.fspath(root)
+    self.show_hidden = show_hidden
+    self.on_progress = on_progress or self._noop
+    self.on_done     = on_done or self._noop
+    self.workers     = workers or min(32, (os.cpu_count() or 1) + 4)
+    self.entries     = []
+    self.finished    = threading.Event()
+    self.cancelled   = False
+    self.pending     = 0 # directories queued or being read
+    self.lock        = threading.Lock()
+    self.executor    = None
+    self.progress_posted = False # lets on_progress coalesce notifications the consumer has not handled yet
+
+
+  @staticmethod
+  def _noop(index): return
+
+
+  @property
+  def done(self):
+    return self.finished.is_set()
+
+
+  def start(self):
+    self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix='SearchIndex')
+    self.submit(self.root, '')
+    return self
+
+
+  def cancel(self):
+    self.cancelled = True
+    if self.executor is not None:
+      self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+  def wait(self, timeout=None):
+    """Block until the walk is finished, for callers without a UI loop"""
+    self.finished.wait(timeout)
+    return self
+
+
+  def submit(self, path, prefix):
+    if self.cancelled: return
+    with self.lock:
+      self.pending += 1
+    self.executor.submit(self.scan, path, prefix)
+
+
+  def scan(self, path, prefix):
+    """Read path and, depth first, the subdirectories beneath it. Subdirectories are handed to the
+    pool only while it has idle workers, as a task per directory costs more than reading most
+    directories."""
+    try:
+      todo = [(path, prefix)]
+      while todo and not self.cancelled:
+        entries, subdirectories = self.read(*todo.pop())
+        self.entries.extend(entries) # a single extend, atomic under the GIL
+        for subdirectory in subdirectories:
+          if self.pending < self.workers: self.submit(*subdirectory)
+          else:                           todo.append(subdirectory)
+        self.on_progress(self)
+    finally:
+      with self.lock:
+        self.pending -= 1
+        finished = self.pending == 0 # subdirectories are queued before their parent finishes
+      if finished and not self.cancelled:
+        self.executor.shutdown(wait=False)
+        self.finished.set()
+        self.on_done(self)
+
+
+  def read(self, path, prefix):
+    entries, subdirectories = [], []
+    try:
+      with os.scandir(path) as iterator:
+        for direntry in iterator:
+          if not self.show_hidden and direntry.name.startswith('.'): continue
+          entry      = PathEntry.from_direntry(direntry)
+          entry.name = prefix + direntry.name
+          entries.append(entry)
+          if entry.filetype == 'directory': # symlinked directories are listed but not followed
+            subdirectories.append((direntry.path, entry.name + '/'))
+    except OSError: # unreadable or vanished directory
+      pass
+    return entries, subdirectories
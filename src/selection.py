@@ -0,0 +1,282 @@
+import sys
+from bisect import bisect_left
+from itertools import chain, filterfalse, islice, repeat
+from operator import le
+
+
+class SelectionTree(dict):
+  """Nested selection dict mapping entry names to True (selected) or to the SelectionTree of a
+  directory with selections inside it. Every node keeps counts of the selections beneath it and a
+  link to its parent, so "is anything selected in here" and "is everything here selected" are
+  answered without walking the tree or the directory listing.
+
+  select_all() does not add a dict entry per name: a whole directory's names are kept in bulk as
+  one tuple, plus a set of the bulk names excluded again, and the dict methods present the bulk as
+  True entries following the explicit ones. Explicitly stored names are interned, so names repeated
+  across directories are stored once."""
+  __slots__ = ('parent', 'name', 'count', 'direct', 'hidden', 'nested', 'bulk', 'bulk_sorted', 'excluded', 'version', 'derived', '__weakref__')
+
+
+  def __init__(self, parent=None, name=None):
+    super().__init__()
+    self.parent = parent
+    self.name   = name
+    self.count  = 0 # selected leaves anywhere beneath this node
+    self.direct = 0 # children that are selected themselves
+    self.hidden = 0 # selected children whose name starts with '.'
+    self.nested = 0 # children that are SelectionTrees
+    self.bulk        = None # names selected by select_all(), in listing order
+    self.bulk_sorted = None # the same names sorted for bisection, often the same tuple
+    self.excluded    = None # bulk names which are unselected, or stored explicitly instead
+    self.version     = 0    # bumped on every change beneath this node
+    self.derived     = None # a value derived from the subtree, cached by its user along with version
+
+
+  def in_bulk(self, name):
+    """Whether name is one of the bulk names, excluded or not"""
+    names = self.bulk_sorted
+    if names is None: return False
+    index = bisect_left(names, name)
+    return index < len(names) and names[index] == name
+
+
+  def bulk_selected(self, name):
+    return self.in_bulk(name) and name not in self.excluded
+
+
+  def bulk_items(self):
+    excluded = self.excluded
+    return ( (name, True) for name in self.bulk if name not in excluded )
+
+
+  def _add(self, n):
+    node = self
+    while node is not None:
+      node.count   += n
+      node.version += 1
+      node = node.parent
+
+
+  def _pop(self, name):
+    value = dict.pop(self, name, None)
+    if value is None and self.bulk_selected(name):
+      self.excluded.add(name)
+      value = True
+    if value is True:
+      self.direct -= 1
+      self.hidden -= name.startswith('.')
+      self._add(-1)
+    elif value is not None:
+      self.nested -= 1
+      value.parent = None
+      self._add(-value.count)
+    return value
+
+
+  def get(self, name, default=None):
+    value = dict.get(self, name)
+    if value is not None:
+      return value
+    if self.bulk is not None and self.bulk_selected(name):
+      return True
+    return default
+
+
+  def __getitem__(self, name):
+    value = self.get(name)
+    if value is None: raise KeyError(name)
+    return value
+
+
+  def __contains__(self, name):
+    return dict.__contains__(self, name) or self.bulk_selected(name)
+
+
+  def __len__(self):
+    if self.bulk is None: return dict.__len__(self)
+    return dict.__len__(self) + len(self.bulk) - len(self.excluded)
+
+
+  def __iter__(self):
+    return iter(self.keys())
+
+
+  # with a bulk these are iterators rather than views, so the bulk is never copied
+  def items(self):
+    if self.bulk is None: return dict.items(self)
+    return chain(dict.items(self), self.bulk_items())
+
+
+  def keys(self):
+    if self.bulk is None: return dict.keys(self)
+    return chain(dict.keys(self), filterfalse(self.excluded.__contains__, self.bulk))
+
+
+  def values(self):
+    if self.bulk is None: return dict.values(self)
+    return chain(dict.values(self), repeat(True, len(self.bulk) - len(self.excluded)))
+
+
+  def __eq__(self, other):
+    if not isinstance(other, dict): return NotImplemented
+    return dict(self.items()) == dict(other.items())
+
+
+  def __ne__(self, other):
+    equal = self.__eq__(other)
+    return equal if equal is NotImplemented else not equal
+
+
+  __hash__ = None
+
+
+  def __repr__(self):
+    return repr(dict(self.items()))
+
+
+  def has_selection(self, name):
+    value = self.get(name)
+    return value is True or (value is not None and value.count > 0)
+
+
+  def select(self, name):
+    if self.get(name) is True: return
+    self._pop(name)
+    if self.in_bulk(name):
+      self.excluded.discard(name)
+    else:
+      dict.__setitem__(self, sys.intern(name), True)
+    self.direct += 1
+    self.hidden += name.startswith('.')
+    self._add(1)
+
+
+  def deselect(self, name):
+    self._pop(name)
+
+
+  def toggle(self, name):
+    if self.has_selection(name):
+      self.deselect(name)
+      return False
+    self.select(name)
+    return True
+
+
+  def child(self, name):
+    """Return the SelectionTree of subdirectory name, creating it (and dropping a selection of the
+    directory itself) if needed"""
+    value = dict.get(self, name)
+    if isinstance(value, SelectionTree):
+      return value
+    self._pop(name) # excludes a bulk name, the subtree stored explicitly takes its place
+    name    = sys.intern(name)
+    subtree = SelectionTree(self, name)
+    dict.__setitem__(self, name, subtree)
+    self.nested += 1
+    return subtree
+
+
+  def lookup(self, names):
+    """The value at the end of a path of names, or None if it is not selected"""
+    value = self
+    for name in names:
+      if not isinstance(value, SelectionTree): return None
+      value = value.get(name)
+    return value
+
+
+  def descendant(self, names):
+    """The SelectionTree at the end of a path of directory names, created with child() as needed"""
+    node = self
+    for name in names:
+      node = node.child(name)
+    return node
+
+
+  def prune(self, name):
+    """Drop the subtree of name if nothing is selected inside it"""
+    value = dict.get(self, name)
+    if isinstance(value, SelectionTree) and value.count == 0:
+      self._pop(name)
+
+
+  def selected_count(self, show_hidden=True):
+    return self.direct if show_hidden else self.direct - self.hidden
+
+
+  def select_all(self, names):
+    """Select every name in bulk, replacing any subtrees among them"""
+    names = tuple(dict.fromkeys(names)) # keeps listing order for the output
+    if all(map(le, names, islice(names, 1, None))):
+      ordered = names
+    else:
+      ordered = tuple(sorted(names))
+    previous = [ name for name, _ in self.bulk_items() ] if self.bulk is not None else ()
+    self.bulk, self.bulk_sorted, self.excluded = names, ordered, set()
+    for name in previous: # earlier bulk names which are not among names stay selected
+      if not self.in_bulk(name):
+        dict.__setitem__(self, sys.intern(name), True)
+    for name, value in list(dict.items(self)):
+      if not self.in_bulk(name): continue
+      if value is True:
+        self.excluded.add(name) # stays explicit, keeping its place in the output
+      else:
+        dict.pop(self, name)
+        self.nested -= 1
+        value.parent = None
+        self._add(-value.count)
+    explicit = [ name for name, value in dict.items(self) if value is True ]
+    direct   = len(explicit) + len(names) - len(self.excluded)
+    self._add(direct - self.direct)
+    self.direct = direct
+    self.hidden = ( sum(map(str.startswith, explicit, repeat('.')))
+                    + sum(map(str.startswith, names, repeat('.')))
+                    - sum(map(str.startswith, self.excluded, repeat('.'))) )
+
+
+  def clear(self):
+    for value in dict.values(self):
+      if value is not True:
+        value.parent = None
+    self._add(-self.count)
+    dict.clear(self)
+    self.direct = self.hidden = self.nested = 0
+    self.bulk = self.bulk_sorted = self.excluded = None
+
+
+  def merge(self, selection):
+    """Add the selections of a plain nested dict, e.g. one produced by get_selection_dict()"""
+    for name, value in selection.items():
+      if value is True:
+        self.select(name)
+      elif isinstance(value, dict):
+        self.child(name).merge(value)
+    return self
+
+
+  @classmethod
+  def from_dict(cls, selection):
+    return cls().merge(selection)
+
+
+  def dump(self):
+    """The selections beneath this node as plain data for a session snapshot, keeping a bulk as
+    its names tuple rather than expanding it"""
+    explicit = { name: True if value is True else value.dump() for name, value in dict.items(self) }
+    return (explicit, self.bulk, self.excluded)
+
+
+  def load(self, dumped):
+    """Add the selections of dump() output to this node"""
+    explicit, bulk, excluded = dumped
+    if bulk is not None:
+      self.select_all(bulk)
+      for name in excluded:
+        if name not in explicit: self.deselect(name)
+    for name, value in explicit.items():
+      if value is True:
+        self.select(name)
+      else:
+        self.child(name).load(value)
+    return self
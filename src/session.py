@@ -0,0 +1,110 @@
+import os, pickle, re, threading
+from pathlib import Path
+from .config import package_name
+
+if (xdg_state_home := os.getenv('XDG_STATE_HOME', False)):
+  state_home = Path(xdg_state_home).expanduser()
+else:
+  state_home = Path.home() / '.local' / 'state'
+sessions_home = state_home / package_name / 'sessions'
+SESSION_VERSION = 1
+session_name_regex = re.compile(r'[\w.-]+')
+
+
+class Session():
+  """A named snapshot of an interactive session: the selection tree, the current directory and
+  cursor, and the listing cache, pickled to the XDG state directory. Listings restored from a
+  snapshot are validated against their directory's mtime on first use, so resuming only lists the
+  directories which changed since. A snapshot taken under a different root is not restored."""
+
+  def __init__(self, name, directory=None):
+    if not session_name_regex.fullmatch(name) or name in ('.', '..'):
+      raise ValueError(f"Invalid session name '{name}', use letters, digits, '.', '-' and '_'")
+    self.name  = name
+    self.path  = Path(directory or sessions_home) / f'{name}.session'
+    self.saved = None # stamp of the state last saved, to skip unchanged autosaves
+    self.autosave_stopped = None
+
+
+  def load(self):
+    """The saved snapshot, or None if there is none or it is unreadable"""
+    try:
+      with open(self.path, 'rb') as f:
+        snapshot = pickle.load(f)
+    except Exception: # missing, truncated, or written by an incompatible version
+      return None
+    if not isinstance(snapshot, dict) or snapshot.get('version') != SESSION_VERSION:
+      return None
+    return snapshot
+
+
+  def stamp(self, ips):
+    cache = ips.listing_cache
+    return (ips.selection.version, id(ips.selection), str(ips.cwd), ips.index, len(cache), cache.size)
+
+
+  def snapshot(self, ips):
+    active = ips.path_list_get(ips.index)
+    return { 'version':   SESSION_VERSION,
+             'root':      str(ips.root),
+             'cwd':       str(ips.cwd),
+             'active':    active.name if active is not None and ips.search is None else None,
+             'index':     ips.index,
+             'selection': ips.selection.dump(),
+             'listings':  ips.listing_cache.dump() }
+
+
+  def save(self, ips):
+    """Write the snapshot of ips, atomically so a crash never leaves a partial one"""
+    stamp     = self.stamp(ips)
+    temporary = self.path.with_name(f'{self.path.name}.{os.getpid()}')
+    try:
+      self.path.parent.mkdir(parents=True, exist_ok=True)
+      with open(temporary, 'wb') as f:
+        pickle.dump(self.snapshot(ips), f, pickle.HIGHEST_PROTOCOL)
+      os.replace(temporary, self.path)
+      self.saved = stamp
+    except OSError:
+      try:            os.unlink(temporary)
+      except OSError: pass
+      raise
+
+
+  def autosave(self, ips):
+    if self.stamp(ips) != self.saved:
+      try:            self.save(ips)
+      except OSError: pass # tried again on the next autosave or on exit
+
+
+  def restore(self, ips, snapshot):
+    """Apply a snapshot from load() to ips, before its first draw. Returns whether it applied."""
+    if snapshot['root'] != str(ips.root): return False
+    ips.listing_cache.load(snapshot['listings'])
+    ips.clear_selection()
+    ips.selection.load(snapshot['selection'])
+    cwd = Path(snapshot['cwd'])
+    while cwd != ips.root and not cwd.is_dir() and cwd.is_relative_to(ips.root):
+      cwd = cwd.parent # the directory is gone, resume at its closest remaining parent
+    if cwd.is_relative_to(ips.root):
+      ips.cwd          = cwd
+      ips.subselection = ips.selection.descendant(cwd.relative_to(ips.root).parts)
+    ips.ls()
+    if snapshot['active'] is not None and cwd == Path(snapshot['cwd']):
+      ips.index = ips.path_list_find(snapshot['active'], min(snapshot['index'], ips.path_list_last))
+    self.saved = self.stamp(ips)
+    return True
+
+
+  def start_autosave(self, ips, interval=60):
+    """Post an autosave to the UI thread of ips every interval seconds until stop_autosave()"""
+    self.autosave_stopped = threading.Event()
+    def autosave_loop(stopped=self.autosave_stopped):
+      while not stopped.wait(interval):
+        ips.post(self.autosave, ips)
+    threading.Thread(target=autosave_loop, name='SessionAutosave', daemon=True).start()
+
+
+  def stop_autosave(self):
+    if self.autosave_stopped is not None:
+      self.autosave_stopped.set()
+      self.autosave_stopped = None
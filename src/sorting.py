@@ -0,0 +1,108 @@
+import re
+from .listing import name_key, directories_first_key
+
+
+_digits   = re.compile(r'(\d+)')
+_versions = re.compile(r'\d+|[^\W\d_]+|[\W_]+')
+
+# pre-release tags sort before the release they precede, e.g. 1.0rc1 < 1.0 < 1.0.1
+_prerelease = { 'dev': 0, 'a': 1, 'alpha': 1, 'b': 2, 'beta': 2, 'c': 3, 'rc': 3, 'pre': 3, 'preview': 3 }
+_end = (1, 0, '') # end of name, after pre-release tags but before anything continuing the version
+
+
+def casefold_sort_key(name):
+  return (name.casefold(), name)
+
+
+def natural_sort_key(name):
+  """file2 < file10: runs of digits compare by value. split() alternates text and digits, so every
+  position holds the same type in every key."""
+  parts = _digits.split(name)
+  parts[1::2] = map(int, parts[1::2])
+  return (parts, name)
+
+
+def version_sort_key(name):
+  """Like natural_sort_key, but pre-release tags sort before the release they belong to, and a
+  name which ends sorts before one continuing it with more version components"""
+  key, numeric = [], False
+  for token in _versions.findall(name):
+    if token.isdigit():
+      key.append((3, int(token), ''))
+      numeric = True
+      continue
+    folded = token.casefold()
+    if numeric and folded in _prerelease:
+      key.append((0, _prerelease[folded], ''))
+    else:
+      key.append((2, 0, folded))
+    numeric = False
+  key.append(_end)
+  return (key, name)
+
+
+class SortOrder():
+  """Sorts path lists of PathEntry by the name key of mode, optionally listing directories first.
+  Computed name keys are memoized on the entries, so re-sorting in another mode, or again after a
+  refresh of a cached listing, needs neither the filesystem nor a second key computation. The
+  instances from get() are shared, as listings cache their sorted views by sort function."""
+  modes     = ('plain', 'casefold', 'natural', 'version')
+  name_keys = { 'plain': None, 'casefold': casefold_sort_key, 'natural': natural_sort_key, 'version': version_sort_key }
+  instances = {}
+
+
+  def __init__(self, mode, dirs_first):
+    self.mode       = mode
+    self.dirs_first = dirs_first
+    compute         = self.name_keys[mode]
+    if compute is None:
+      self.name_key = name_key
+    else:
+      def cached_name_key(entry):
+        keys = entry.sort_keys
+        if keys is None:
+          keys = entry.sort_keys = {}
+        try:
+          return keys[mode]
+        except KeyError:
+          key = keys[mode] = compute(entry.name)
+          return key
+      self.name_key = cached_name_key
+    if dirs_first and compute is None:
+      self.key = directories_first_key
+    elif dirs_first:
+      cached_key = self.name_key
+      self.key = lambda entry: (not entry.is_dir, cached_key(entry))
+    else:
+      self.key = self.name_key
+
+
+  @classmethod
+  def get(cls, mode='plain', dirs_first=False):
+    if mode not in cls.name_keys:
+      raise ValueError(f"Unknown sort mode '{mode}', expected one of {', '.join(cls.modes)}")
+    try:
+      return cls.instances[mode, dirs_first]
+    except KeyError:
+      instance = cls.instances[mode, dirs_first] = cls(mode, dirs_first)
+      return instance
+
+
+  def with_mode(self, mode):
+    return self.get(mode, self.dirs_first)
+
+
+  def with_dirs_first(self, dirs_first):
+    return self.get(self.mode, dirs_first)
+
+
+  def next_mode(self):
+    return self.with_mode(self.modes[(self.modes.index(self.mode) + 1) % len(self.modes)])
+
+
+  def __call__(self, path_list, sorter=sorted):
+    return sorter(path_list, key=self.key)
+
+
+  def __repr__(self):
+    return f"{self.__class__.__name__}({self.mode!r}, dirs_first={self.dirs_first})"
@@ -1,3 +1,6 @@
+from .display_width import display_width
+
+
 class Style():
   prefix     = ''
   foreground = None
@@ -50,8 +53,8 @@ class Style():
     else:                           ANSI_sequence=''
     if self.reset:                  format_placeholder += "\033[0m"
     self.template = f"{self.prefix}{ANSI_sequence}{format_placeholder}{self.suffix}"
-    self.suffix_length = len(self.suffix)
-    self.prefix_length = len(self.prefix)
+    self.suffix_length = display_width(self.suffix) # columns, e.g. a wide glyph takes two
+    self.prefix_length = display_width(self.prefix)
     self.length = self.suffix_length + self.prefix_length
 
 
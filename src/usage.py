@@ -0,0 +1,236 @@
+import os, stat, threading, weakref
+from concurrent.futures import ThreadPoolExecutor
+
+
+class SelectionUsage():
+  """Total bytes and file count of everything selected in a SelectionTree, selected directories
+  counted recursively. Sizes are measured by a pool of stat workers and never on the UI thread:
+  totals() only adds up what has been measured so far, requesting the rest, and reports how many
+  selected entries are still pending.
+
+  totals() is incremental. Every SelectionTree node keeps the sum of its subtree in derived, tagged
+  with the node's version, so after a toggle only the nodes on the path to the change are added up
+  again. The names of a select_all() bulk are measured in chunks and summed once. Workers cache what
+  they read of a directory by inode, valid while the directory's mtime is unchanged, so measuring a
+  directory again only needs an lstat per subdirectory. on_progress(usage) is called from the
+  worker threads when results are ready for apply_results()."""
+  chunk_size = 4096 # bulk names measured per worker task
+
+  def __init__(self, on_progress=None, workers=None):
+    self.on_progress = on_progress or self._noop
+    self.workers     = workers or min(8, (os.cpu_count() or 1) + 2)
+    self.executor    = None
+    self.explicit    = {} # id(node) -> [{name: (bytes, files)}, names requested] of its explicit selections
+    self.bulk        = {} # id(node) -> [its bulk tuple, {name: (bytes, files)}, chunks pending, totals]
+    self.inodes      = {} # (st_dev, st_ino) -> (st_mtime_ns, bytes, files, subdirectory names) of a directory
+    self.results     = [] # ((id(node), bulk or None), {name: (bytes, files)}) from the workers, not yet applied
+    self.generation  = 0  # bumped whenever results are applied, invalidating sums with pending entries
+    self.cleared     = 0  # generation of the last clear(), every sum from before it is invalid
+    self.lock        = threading.Lock()
+    self.progress_posted = False
+
+
+  @staticmethod
+  def _noop(usage): return
+
+
+  def close(self):
+    if self.executor is not None:
+      self.executor.shutdown(wait=False, cancel_futures=True)
+      self.executor = None
+
+
+  def clear(self):
+    """Forget every measured size, e.g. after a manual refresh"""
+    for entry in self.explicit.values(): entry[:] = [{}, set()]
+    for entry in self.bulk.values(): self.release(entry)
+    self.inodes.clear()
+    self.generation += 1
+    self.cleared     = self.generation
+
+
+  def submit(self, function, *args):
+    if self.executor is None:
+      self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix='SelectionUsage')
+    self.executor.submit(function, *args)
+
+
+  def track(self, node):
+    """Drop the entries of node when it is dropped, called before its first entry is made"""
+    if id(node) not in self.explicit and id(node) not in self.bulk:
+      weakref.finalize(node, self.forget, id(node))
+
+
+  def forget(self, node_id):
+    self.explicit.pop(node_id, None)
+    self.bulk.pop(node_id, None)
+
+
+  def request(self, node, path, names):
+    """Have the explicitly selected names of node not requested yet measured, as a single task
+    split into chunks on a worker, so the UI thread never does per name work beyond a set lookup"""
+    entry = self.explicit.get(id(node))
+    if entry is None:
+      self.track(node)
+      entry = self.explicit[id(node)] = [{}, set()]
+    requested = entry[1]
+    names = [ name for name in names if name not in requested ]
+    if names:
+      requested.update(names)
+      self.submit(self.split_names, path, (id(node), None), names)
+
+
+  def totals(self, node, path):
+    """(bytes, files, pending) of the selections beneath node, the SelectionTree of directory path"""
+    memo = node.derived
+    if ( memo is not None and memo[0] == node.version
+         and (memo[1] == self.generation or (memo[4] == 0 and memo[1] >= self.cleared)) ):
+      return memo[2:]
+    size, files, pending, unmeasured = 0, 0, 0, []
+    explicit = self.explicit.get(id(node))
+    sizes    = explicit[0] if explicit is not None else {}
+    for name, value in dict.items(node):
+      if value is True:
+        measured = sizes.get(name)
+        if measured is None:
+          unmeasured.append(name)
+        else:
+          size  += measured[0]
+          files += measured[1]
+      else:
+        sub = self.totals(value, os.path.join(path, name))
+        size, files, pending = size + sub[0], files + sub[1], pending + sub[2]
+    if unmeasured:
+      pending += len(unmeasured)
+      self.request(node, path, unmeasured)
+    if node.bulk is not None:
+      sub = self.bulk_totals(node, path)
+      size, files, pending = size + sub[0], files + sub[1], pending + sub[2]
+    elif id(node) in self.bulk: # deselected since
+      self.release(self.bulk[id(node)])
+    node.derived = (node.version, self.generation, size, files, pending)
+    return size, files, pending
+
+
+  def bulk_totals(self, node, path):
+    """Totals of the bulk names of node which are not excluded, explicit names being counted by
+    totals() already. The bulk is measured in chunks spread over the workers. There is one entry
+    per node, replaced along with the node's bulk and dropped along with the node."""
+    bulk  = node.bulk
+    entry = self.bulk.get(id(node))
+    if entry is None or entry[0] is not bulk:
+      if entry is None:
+        self.track(node)
+      entry = self.bulk[id(node)] = [bulk, {}, -(-len(bulk) // self.chunk_size), (0, 0)]
+      self.submit(self.split_names, path, (id(node), bulk), bulk)
+    _, sizes, remaining, totals = entry
+    if remaining:
+      return 0, 0, len(bulk) - len(node.excluded)
+    size, files = totals
+    for name in node.excluded:
+      measured = sizes.get(name, (0, 0))
+      size, files = size - measured[0], files - measured[1]
+    return size, files, 0
+
+
+  @staticmethod
+  def release(entry):
+    """Drop the bulk and sizes of an entry, keeping the entry itself for the node's finalizer"""
+    entry[:] = [None, {}, 0, (0, 0)]
+
+
+  def apply_results(self):
+    """Store the sizes measured by the workers. Returns whether there were any."""
+    self.progress_posted = False
+    with self.lock:
+      results, self.results = self.results, []
+    for (node_id, bulk), value in results:
+      if bulk is None: # a chunk of explicitly selected names
+        entry = self.explicit.get(node_id)
+        if entry is not None:
+          entry[0].update(value)
+          entry[1].difference_update(value)
+      else: # a chunk of a bulk
+        entry = self.bulk.get(node_id)
+        if entry is not None and entry[0] is bulk:
+          entry[1].update(value)
+          entry[2] -= 1
+          if entry[2] == 0:
+            sizes    = entry[1].values()
+            entry[3] = ( sum( size for size, _ in sizes ), sum( files for _, files in sizes ) )
+    if results:
+      self.generation += 1
+    return bool(results)
+
+
+  def post(self, key, value):
+    with self.lock:
+      self.results.append((key, value))
+    if not self.progress_posted:
+      self.progress_posted = True
+      self.on_progress(self)
+
+
+  def split_names(self, directory, key, names):
+    for start in range(0, len(names), self.chunk_size):
+      self.submit(self.measure_names, directory, key, names[start:start + self.chunk_size])
+
+
+  def measure_names(self, directory, key, names):
+    self.post(key, { name: self.measure(os.path.join(directory, name)) for name in names })
+
+
+  def measure(self, path):
+    """(bytes, files) of a path, directories counted recursively without following symlinks"""
+    try:
+      st = os.lstat(path)
+    except OSError: # vanished since it was selected
+      return 0, 0
+    if not stat.S_ISDIR(st.st_mode):
+      return st.st_size, 1
+    size = files = 0
+    todo = [(path, st)]
+    while todo:
+      directory, st = todo.pop()
+      direct_size, direct_files, subdirectories = self.read_directory(directory, st)
+      size  += direct_size
+      files += direct_files
+      for name in subdirectories:
+        subdirectory = os.path.join(directory, name)
+        try:
+          todo.append((subdirectory, os.lstat(subdirectory)))
+        except OSError:
+          pass
+    return size, files
+
+
+  def read_directory(self, directory, st):
+    """Bytes and count of the files directly in a directory, and its subdirectory names"""
+    key    = (st.st_dev, st.st_ino)
+    cached = self.inodes.get(key)
+    if cached is not None and cached[0] == st.st_mtime_ns:
+      return cached[1:]
+    size, files, subdirectories = 0, 0, []
+    try:
+      with os.scandir(directory) as iterator:
+        for direntry in iterator:
+          try:
+            if direntry.is_dir(follow_symlinks=False):
+              subdirectories.append(direntry.name)
+            else:
+              size  += direntry.stat(follow_symlinks=False).st_size
+              files += 1
+          except OSError:
+            pass
+    except OSError:
+      return 0, 0, ()
+    self.inodes[key] = (st.st_mtime_ns, size, files, subdirectories)
+    return size, files, subdirectories
+
+
+def format_size(size):
+  """Human readable byte count, like ls -h"""
+  for unit in ('B', 'K', 'M', 'G', 'T', 'P'):
+    if size < 1024 or unit == 'P': break
+    size /= 1024
+  return f"{size:.0f}{unit}" if unit == 'B' or size >= 10 else f"{size:.1f}{unit}"
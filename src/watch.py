@@ -0,0 +1,166 @@
+import ctypes, ctypes.util, os, select, struct, threading, time
+
+"""
+Directory watchers report the names of entries which were created, deleted or renamed in the watched
+directory by calling on_change(path, names) from their own thread. The receiver re-stats the names to
+find out what happened to them, so a burst of events for one name collapses into a single update.
+"""
+
+IN_MOVED_FROM  = 0x00000040
+IN_MOVED_TO    = 0x00000080
+IN_CREATE      = 0x00000100
+IN_DELETE      = 0x00000200
+IN_Q_OVERFLOW  = 0x00004000
+IN_ONLYDIR     = 0x01000000
+IN_WATCH_MASK  = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_ONLYDIR
+event_header   = struct.Struct('iIII') # wd, mask, cookie, len
+OVERFLOW       = None # passed as names when events were lost and the directory must be re-read
+
+
+class Watcher(threading.Thread):
+  latency = 0.05 # seconds to keep collecting events before reporting a batch
+
+
+  def __init__(self, on_change):
+    super().__init__(daemon=True)
+    self.on_change = on_change
+    self.path      = None
+    self.closed    = False
+
+
+  def watch(self, path):
+    self.path = os.fspath(path)
+
+
+  def close(self):
+    self.closed = True
+
+
+class InotifyWatcher(Watcher):
+  """Linux inotify through ctypes, so no third party module is needed"""
+
+  def __init__(self, on_change):
+    super().__init__(on_change)
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    self.inotify_add_watch = libc.inotify_add_watch
+    self.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    self.inotify_rm_watch = libc.inotify_rm_watch
+    self.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    if self.fd < 0:
+      errno = ctypes.get_errno()
+      raise OSError(errno, os.strerror(errno))
+    self.wd = -1
+    self.stop_r, self.stop_w = os.pipe()
+
+
+  def watch(self, path):
+    path = os.fspath(path)
+    if path == self.path: return
+    if self.wd >= 0:
+      self.inotify_rm_watch(self.fd, self.wd)
+    self.wd = self.inotify_add_watch(self.fd, os.fsencode(path), IN_WATCH_MASK)
+    if self.wd < 0: # e.g. ENOSPC once fs.inotify.max_user_watches is used up, or EACCES
+      errno, self.path = ctypes.get_errno(), None
+      raise OSError(errno, os.strerror(errno), path)
+    super().watch(path)
+
+
+  def close(self):
+    if self.closed: return
+    super().close()
+    if self.ident is None: # never started, so run() will not close the descriptors
+      for fd in (self.fd, self.stop_r, self.stop_w): os.close(fd)
+      return
+    os.write(self.stop_w, b'\0')
+
+
+  def read_events(self, names):
+    try:
+      data = os.read(self.fd, 1 << 16)
+    except BlockingIOError:
+      return names
+    offset = 0
+    while offset < len(data):
+      wd, mask, cookie, length = event_header.unpack_from(data, offset)
+      offset += event_header.size
+      name = data[offset:offset+length].rstrip(b'\0')
+      offset += length
+      if mask & IN_Q_OVERFLOW:
+        return OVERFLOW
+      if wd == self.wd and name and names is not OVERFLOW:
+        names.add(os.fsdecode(name))
+    return names
+
+
+  def run(self):
+    try:
+      while not self.closed:
+        ready, _, _ = select.select([self.fd, self.stop_r], [], [])
+        if self.stop_r in ready: break
+        path, names = self.path, self.read_events(set())
+        deadline = time.monotonic() + self.latency
+        while names is not OVERFLOW and (timeout := deadline - time.monotonic()) > 0:
+          if select.select([self.fd], [], [], timeout)[0]:
+            names = self.read_events(names)
+        if names is OVERFLOW or names:
+          self.on_change(path, names)
+    finally:
+      os.close(self.fd)
+      os.close(self.stop_r)
+      os.close(self.stop_w)
+
+
+class PollingWatcher(Watcher):
+  """Fallback for platforms and filesystems without inotify: compare the directory's mtime and
+  entry names every interval seconds"""
+
+  def __init__(self, on_change, interval=1.0):
+    super().__init__(on_change)
+    self.interval = interval
+    self.names    = None
+    self.mtime_ns = None
+    self.wakeup   = threading.Event()
+
+
+  def watch(self, path):
+    path = os.fspath(path)
+    if path == self.path: return
+    super().watch(path)
+    self.names = None
+    self.wakeup.set()
+
+
+  def close(self):
+    super().close()
+    self.wakeup.set()
+
+
+  def poll(self):
+    path = self.path
+    try:
+      mtime_ns = os.stat(path).st_mtime_ns
+      if self.names is not None and mtime_ns == self.mtime_ns: return
+      names = set(os.listdir(path))
+    except OSError:
+      return
+    if self.names is not None and path == self.path:
+      changed = names.symmetric_difference(self.names)
+      if changed:
+        self.on_change(path, changed)
+    self.names, self.mtime_ns = names, mtime_ns
+
+
+  def run(self):
+    while not self.closed:
+      if self.path is not None:
+        self.poll()
+      self.wakeup.wait(self.interval)
+      self.wakeup.clear()
+
+
+def make_watcher(on_change, poll_interval=1.0):
+  try:
+    return InotifyWatcher(on_change)
+  except (OSError, AttributeError, TypeError): # no libc, no inotify symbols, or inotify_init1 failed
+    return PollingWatcher(on_change, poll_interval)
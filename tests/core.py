@@ -50,6 +50,7 @@ def capturable_interactive_path_selector(monkeypatch, session_tmp_path):
     monkeypatch.setattr(ips, "puts", lambda *x:None)
     ips.launch()
     monkeypatch.setattr(ips, "puts", _monkeypatch_puts)
+    ips.reset_screen() # nothing drawn during launch reached stdout
     try:
       yield ips
     finally:
@@ -0,0 +1,42 @@
+import io, os
+from .core import *
+from src import export
+from src.batch import BatchSelection, PathRules, glob_to_regex
+
+
+def test_glob_to_regex():
+  import re
+  def matches(pattern, path): return re.fullmatch(glob_to_regex(pattern), path) is not None
+  assert matches('*.py', 'a.py') and matches('*.py', 'x/y/a.py') and not matches('*.py', 'a.pyc')
+  assert matches('src/*.py', 'src/a.py') and not matches('src/*.py', 'src/x/a.py')
+  assert matches('src/**/*.py', 'src/a.py') and matches('src/**/*.py', 'src/x/y/a.py')
+  assert matches('/a?c', 'abc') and not matches('/a?c', 'x/abc') and not matches('a?c', 'a/c')
+  assert matches('[!a]*', 'b') and not matches('[!a]*', 'a') and matches('[a', '[a')
+
+
+def test_batch_selection(tmp_path):
+  for path in ('a/keep.py', 'a/skip.pyc', 'a/build/out.py', 'b/c/deep.py', 'b/data.parquet/part-0',
+               'top.py', '.hidden/x.py'):
+    (tmp_path/path).parent.mkdir(parents=True, exist_ok=True)
+    (tmp_path/path).touch()
+  rules = PathRules(include=['*.py', '*.parquet'], exclude=['build/'])
+  tree  = BatchSelection(tmp_path, rules, workers=2).run()
+  assert export.selection_dict(tree) == {'a': {'keep.py': True}, 'b': {'c': {'deep.py': True}, 'data.parquet': True}, 'top.py': True}
+
+  output = io.BytesIO()
+  export.write_selection_paths(output, str(tmp_path), tree, '\0')
+  assert output.getvalue().split(b'\0')[:-1] == [ os.fsencode(tmp_path/path) for path in
+    ('a/keep.py', 'b/c/deep.py', 'b/data.parquet', 'top.py') ]
+
+  walk = BatchSelection(tmp_path, PathRules(exclude=['re:\\.pyc$', 'b']), show_hidden=True)
+  assert sorted(export.iter_selection_paths('', walk.run())) == ['/.hidden/x.py', '/a/build/out.py', '/a/keep.py', '/top.py']
+  assert walk.errors == []
+
+
+def test_batch_selection_raises_worker_exceptions(tmp_path):
+  (tmp_path/'a').touch()
+  rules = PathRules()
+  def broken(relative, is_dir): raise RuntimeError('broken rule')
+  rules.included = broken
+  with pytest.raises(RuntimeError, match='broken rule'):
+    BatchSelection(tmp_path, rules, workers=2).run()
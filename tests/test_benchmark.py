@@ -0,0 +1,182 @@
+import json, os, platform, statistics, subprocess, sys, time, tracemalloc
+from .core import *
+from src import export
+from src.selection import SelectionTree
+from src.sorting import SortOrder
+
+"""
+Microbenchmarks of the hot paths on synthetic trees. They are skipped unless PATHPICK_BENCHMARK
+names the JSON file to write the timings to, so results can be compared between commits:
+
+  PATHPICK_BENCHMARK=bench.json pytest tests/test_benchmark.py
+  PATHPICK_BENCHMARK_SIZES=1000,100000 PATHPICK_BENCHMARK=bench.json pytest tests/test_benchmark.py
+"""
+
+BENCHMARK_OUTPUT = os.getenv('PATHPICK_BENCHMARK')
+BENCHMARK_SIZES  = [ int(n) for n in os.getenv('PATHPICK_BENCHMARK_SIZES', '1000,100000,1000000').split(',') ]
+BENCHMARK_REPEAT = int(os.getenv('PATHPICK_BENCHMARK_REPEAT', 5))
+DEEP_TREE_DEPTH  = 200
+
+pytestmark = pytest.mark.skipif(not BENCHMARK_OUTPUT, reason='set PATHPICK_BENCHMARK=<json file> to run benchmarks')
+
+
+@pytest.fixture(scope='module')
+def benchmark_results():
+  results = []
+  yield results
+  try:
+    commit = subprocess.run( ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                             cwd=os.path.dirname(__file__) ).stdout.strip() or None
+  except OSError:
+    commit = None
+  with open(BENCHMARK_OUTPUT, 'w') as f:
+    json.dump({ 'commit':    commit,
+                'python':    sys.version.split()[0],
+                'platform':  platform.platform(),
+                'timestamp': time.time(),
+                'repeat':    BENCHMARK_REPEAT,
+                'results':   results }, f, indent=2)
+
+
+def backdate(directory):
+  """Make a directory old enough for its listing not to be racy, so warm listings hit the cache"""
+  os.utime(directory, ns=(1_000_000_000, 1_000_000_000))
+
+
+@pytest.fixture(scope='module')
+def flat_trees(tmp_path_factory):
+  trees = {}
+  def get(size):
+    if size not in trees:
+      tree = tmp_path_factory.mktemp(f'flat{size}')
+      for i in range(size):
+        if i % 10 == 0: os.mkdir(tree / f'dir{i:07d}')
+        else:           os.close(os.open(tree / f'file{i:07d}', os.O_CREAT | os.O_WRONLY))
+      backdate(tree)
+      trees[size] = tree
+    return trees[size]
+  return get
+
+
+@pytest.fixture(scope='module')
+def deep_tree(tmp_path_factory):
+  tree = nest = tmp_path_factory.mktemp('deep')
+  for depth in range(DEEP_TREE_DEPTH):
+    (nest / 'file').touch()
+    backdate(nest)
+    nest /= 'nest'
+    nest.mkdir()
+  backdate(nest)
+  return tree
+
+
+def measure(results, benchmark, size, function, setup=None):
+  timings = []
+  for _ in range(BENCHMARK_REPEAT):
+    if setup is not None: setup()
+    start = time.perf_counter()
+    function()
+    timings.append(time.perf_counter() - start)
+  results.append({ 'benchmark': benchmark,
+                   'size':      size,
+                   'min':       min(timings),
+                   'median':    statistics.median(timings),
+                   'max':       max(timings) })
+
+
+def null_tty_selector(root, **kwargs):
+  return InteractivePathSelector(root=root, tty=os.devnull, stream_threshold=0, **kwargs)
+
+
+@pytest.mark.parametrize('size', BENCHMARK_SIZES)
+def test_benchmark_flat(size, flat_trees, benchmark_results):
+  ips = null_tty_selector(flat_trees(size), listing_cache_size=2*size)
+  try:
+    measure(benchmark_results, 'ls_cold', size, ips.ls, setup=ips.listing_cache.clear)
+    listing = ips.listing_cache.peek(ips.cwd)
+    measure(benchmark_results, 'ls_warm', size, ips.ls)
+    assert ips.listing_cache.peek(ips.cwd) is listing # served from the cache, not read again
+    entries = listing.entries
+    for mode in SortOrder.modes:
+      sort_order = SortOrder.get(mode)
+      measure(benchmark_results, f'sort_path_list_{mode}', size, lambda: sort_order(entries))
+    measure(benchmark_results, 'sort_path_list_directories_first', size,
+            lambda: SortOrder.get('plain', dirs_first=True)(entries))
+    measure(benchmark_results, 'draw_page', size, lambda: (ips.draw_page(), ips.flush()), setup=ips.reset_screen)
+    measure(benchmark_results, 'toggle_all_selected', size, ips.toggle_all_selected)
+    if not ips.all_selected(): ips.toggle_all_selected()
+    measure(benchmark_results, 'get_selection_paths', size, ips.get_selection_paths)
+    measure(benchmark_results, 'get_selection_dict', size, ips.get_selection_dict)
+    assert len(ips.get_selection_paths()) == size
+  finally:
+    ips.close()
+
+
+def test_benchmark_deep(deep_tree, benchmark_results):
+  ips = null_tty_selector(deep_tree, dirs_first=True)
+  try:
+    def descend_to_bottom():
+      ips.cwd, ips.subselection = ips.root, ips.selection
+      ips.ls()
+      while ips.path_list_any:
+        ips.index = 0
+        ips.descend()
+    def select_every_level():
+      ips.cwd, ips.subselection = ips.root, ips.selection
+      ips.ls()
+      while ips.path_list_any:
+        ips.index = 1
+        ips.toggle_selected()
+        ips.index = 0
+        ips.descend()
+    measure(benchmark_results, 'descend_deep', DEEP_TREE_DEPTH, descend_to_bottom)
+    ips.clear_selection()
+    select_every_level()
+    measure(benchmark_results, 'get_selection_paths_deep', DEEP_TREE_DEPTH, ips.get_selection_paths)
+    measure(benchmark_results, 'get_selection_dict_deep', DEEP_TREE_DEPTH, ips.get_selection_dict)
+    assert len(ips.get_selection_paths()) == DEEP_TREE_DEPTH
+  finally:
+    ips.close()
+
+
+def allocated(build):
+  """Bytes allocated by build() which are still held by its result"""
+  tracemalloc.start()
+  try:
+    result = build()
+    return tracemalloc.get_traced_memory()[0]
+  finally:
+    tracemalloc.stop()
+
+
+def peak_allocated(function):
+  """Peak bytes allocated while function() runs"""
+  tracemalloc.start()
+  try:
+    function()
+    return tracemalloc.get_traced_memory()[1]
+  finally:
+    tracemalloc.stop()
+
+
+@pytest.mark.parametrize('size', BENCHMARK_SIZES)
+def test_benchmark_selection_memory(size, benchmark_results):
+  names = [ f'file{i:07d}' for i in range(size) ]
+  def nested_dict(): # the plain nested dicts the selection used to be
+    return { 'directory': dict.fromkeys(names, True) }
+  def selection_tree():
+    tree = SelectionTree()
+    tree.child('directory').select_all(names)
+    return tree
+  dict_bytes = allocated(nested_dict)
+  tree_bytes = allocated(selection_tree)
+  for benchmark, n in (('selection_memory_dict', dict_bytes), ('selection_memory_tree', tree_bytes)):
+    benchmark_results.append({ 'benchmark': benchmark, 'size': size, 'bytes': n })
+  assert tree_bytes < dict_bytes
+
+  tree = selection_tree()
+  class Discard():
+    def write(self, data): pass
+  export_peak = peak_allocated(lambda: export.write_selection_paths(Discard(), '/root', tree, '\0'))
+  benchmark_results.append({ 'benchmark': 'export_peak_memory_bulk', 'size': size, 'bytes': export_peak })
+  assert export_peak < 4 * 1024 ** 2 # a few chunks of paths, whatever the size of the bulk
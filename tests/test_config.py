@@ -0,0 +1,25 @@
+import os
+from .core import *
+from src import config
+from src.style import Style
+
+
+def test_config_cache(tmp_path, monkeypatch):
+  monkeypatch.setattr(config, 'config_cache_path', tmp_path/'cache'/'config.cache')
+  user_config = tmp_path/'config.ini'
+  user_config.write_text('[style.header]\nbold = true\n')
+  path, parsed = config.read_user_config_file(user_config)
+  assert path == str(user_config)
+  assert isinstance(parsed['style']['header'], Style) and parsed['style']['header'].bold
+
+  def reparse(*args): raise AssertionError('config parsed again')
+  parse = config._parse_user_config_file
+  monkeypatch.setattr(config, '_parse_user_config_file', reparse)
+  path, cached = config.read_user_config_file(user_config)
+  assert cached['default'] == parsed['default'] and cached['style']['header'].bold
+
+  user_config.write_text('[style.header]\nbold = false\n')
+  os.utime(user_config, ns=(0, 0))
+  monkeypatch.setattr(config, '_parse_user_config_file', parse)
+  path, parsed = config.read_user_config_file(user_config)
+  assert not parsed['style']['header'].bold
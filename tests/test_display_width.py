@@ -0,0 +1,24 @@
+from .core import *
+from src.display_width import display_width, take_left, take_right, char_width, WIDTH_RANGES
+from src.style import Style
+
+
+def test_display_width():
+  assert display_width('file.txt') == 8
+  assert display_width('日本語.txt') == 10
+  assert display_width('é') == 1 # combining acute accent
+  assert display_width('🐍') == 2
+  assert char_width('​') == 0 and char_width('Ａ') == 2 and char_width('') == 1
+  assert all( first <= last < next_first for (first, last, _), (next_first, _, _) in zip(WIDTH_RANGES, WIDTH_RANGES[1:]) )
+  assert Style(prefix='漢 ', suffix='/').length == 4
+
+
+def test_take():
+  assert take_left('日本語.txt', 5) == '日本'
+  assert take_left('日本語.txt', 4) == '日本'
+  assert take_left('abc', -1) == ''
+  assert take_right('日本語.txt', 7) == '語.txt'
+  assert take_right('日本語.txt', 5) == '.txt'
+  assert take_right('aéb', 1) == 'b'
+  assert take_right('aéb', 2) == 'éb'
+  assert take_right('abc', 0) == ''
@@ -0,0 +1,39 @@
+import os
+from .core import *
+from src.expand import SelectionExpander
+from src.selection import SelectionTree
+
+
+def test_selection_expander(tmp_path, monkeypatch):
+  for path in ('a/x', 'a/b/y', 'a/b/c/z', 'a/.hidden', 'file'):
+    (tmp_path/path).parent.mkdir(parents=True, exist_ok=True)
+    (tmp_path/path).touch()
+  os.link(tmp_path/'a/x', tmp_path/'a/b/x-link')
+  os.symlink(tmp_path/'a/b', tmp_path/'a/loop')
+  selection = SelectionTree()
+  selection.select('a')
+  selection.select('file')
+  selection.select('missing') # removed since it was selected, output as it is
+
+  def expand(**kwargs):
+    expander = SelectionExpander(workers=2, **kwargs)
+    paths = [ path[len(str(tmp_path)) + 1:] for path in expander.iter_paths(str(tmp_path), selection) ]
+    assert expander.errors == []
+    return paths
+
+  assert expand() == ['a/.hidden', 'a/loop', 'a/x', 'a/b/x-link', 'a/b/y', 'a/b/c/z', 'file', 'missing']
+  assert expand(max_depth=1) == ['a/.hidden', 'a/loop', 'a/x', 'a/b', 'file', 'missing']
+  assert expand(follow_symlinks=True, dedup=True) == ['a/.hidden', 'a/x', 'a/b/y', 'a/b/c/z', 'file', 'missing']
+  assert SelectionExpander(max_depth=2).selection_dict(str(tmp_path), selection) == {
+    'a': {'.hidden': True, 'loop': True, 'x': True, 'b': {'c': True, 'x-link': True, 'y': True}},
+    'file': True, 'missing': True}
+
+  scandir = os.scandir
+  def unreadable(path):
+    if path == str(tmp_path/'a'/'b'): raise PermissionError(13, 'Permission denied', path)
+    return scandir(path)
+  monkeypatch.setattr(os, 'scandir', unreadable)
+  expander = SelectionExpander(workers=2)
+  assert [ path[len(str(tmp_path)) + 1:] for path in expander.iter_paths(str(tmp_path), selection) ] == [
+    'a/.hidden', 'a/loop', 'a/x', 'file', 'missing']
+  assert expander.errors == [(str(tmp_path/'a'/'b'), 'Permission denied')]
@@ -0,0 +1,24 @@
+from .core import *
+from src.filter import PathFilter
+
+
+def test_filter_substring_before_fuzzy():
+  path_filter = PathFilter(['a_b_c', 'abc', 'xxabc', 'aXbc', 'ABC', 'zzz'], key=str)
+  assert path_filter.push('abc').results == ['abc', 'xxabc', 'ABC', 'aXbc', 'a_b_c']
+  assert path_filter.pop().results == ['abc', 'xxabc', 'ABC', 'a_b_c', 'aXbc']
+  assert path_filter.pop().pop().results == ['a_b_c', 'abc', 'xxabc', 'aXbc', 'ABC', 'zzz']
+
+
+def test_filter_smartcase():
+  path_filter = PathFilter(['abc', 'ABC', 'aBc'], key=str)
+  assert path_filter.push('ab').results == ['abc', 'ABC', 'aBc']
+  assert path_filter.push('C').results == []
+  assert path_filter.pop().pop().push('Bc').results == ['aBc']
+
+
+def test_filter_extend_and_rebase():
+  path_filter = PathFilter(['abc', 'bcd'], key=str).push('bd')
+  path_filter.extend(['bd', 'xyz'])
+  assert path_filter.results == ['bcd', 'bd'] # late entries are appended
+  assert path_filter.pop().results == ['abc', 'bcd', 'bd']
+  assert path_filter.rebase(['b', 'abd']).push('d').results == ['abd']
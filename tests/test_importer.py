@@ -0,0 +1,26 @@
+import io
+from .core import *
+from src.importer import SelectionImporter, read_path_list
+from src.selection import SelectionTree
+
+
+def test_read_path_list():
+  assert list(read_path_list(io.BytesIO(b'a\nb c\n\nd'), chunk_size=3)) == ['a', 'b c', 'd']
+  assert list(read_path_list(io.BytesIO(b'a\nb\0c\0'), chunk_size=4)) == ['a\nb', 'c']
+
+
+def test_selection_importer(tmp_path):
+  (tmp_path/'dir'/'sub').mkdir(parents=True)
+  names = [ f'{i:02}' for i in range(40) ]
+  for name in names: (tmp_path/'dir'/name).touch()
+  (tmp_path/'file').touch()
+  tree = SelectionTree()
+  tree.select('kept')
+  importer = SelectionImporter(tmp_path, workers=2)
+  importer.add_paths([ tmp_path/'file', tmp_path/'gone', tmp_path.parent, *( tmp_path/'dir'/name for name in names ) ])
+  importer.add_dict({ 'dir': { 'sub': True, 'missing': True }, 'nowhere': { 'x': True } })
+  importer.merge_into(tree)
+  assert tree.lookup(['file']) is True and tree.lookup(['kept']) is True
+  assert sorted(tree['dir'].keys()) == sorted(['sub', *names])
+  assert importer.imported == 42
+  assert sorted(importer.dropped) == sorted(map(str, [ tmp_path/'gone', tmp_path.parent, tmp_path/'dir'/'missing', tmp_path/'nowhere'/'x' ]))
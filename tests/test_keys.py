@@ -0,0 +1,17 @@
+from .core import *
+from src.keys import KeyDecoder
+
+
+def test_key_decoder():
+  decoder = KeyDecoder()
+  assert decoder.feed(b'jj\x1b[A\x1b[5~\x1bOB\x1bx\n') == ['j', 'j', '\x1b[A', '\x1b[5~', '\x1bOB', '\x1bx', '\n']
+  assert decoder.feed(b'\x1b') == [] and decoder.pending == '\x1b'
+  assert decoder.flush() == ['\x1b']
+  assert decoder.feed(b'\x1b\x1b[B') == ['\x1b', '\x1b[B']
+
+
+def test_key_decoder_split_input():
+  decoder = KeyDecoder()
+  assert decoder.feed(b'a\x1b[6') == ['a']
+  assert decoder.feed(b'~\xc3') == ['\x1b[6~']
+  assert decoder.feed(b'\xa9') == ['é']
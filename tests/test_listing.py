@@ -0,0 +1,74 @@
+import os
+from .core import *
+import random
+from src.listing import scandir, sorted_incrementally, ListingCache, Listing, name_key
+
+
+def test_scandir_types(tmp_path):
+  (tmp_path/'file').touch()
+  (tmp_path/'dir').mkdir()
+  (tmp_path/'dirlink').symlink_to(tmp_path/'dir')
+  (tmp_path/'broken').symlink_to(tmp_path/'missing')
+  os.mkfifo(tmp_path/'fifo')
+  entries = { e.name: e for e in scandir(tmp_path) }
+  assert { k: e.filetype for k,e in entries.items() } == { 'file':    'file',
+                                                           'dir':     'directory',
+                                                           'dirlink': 'symlink',
+                                                           'broken':  'symlink',
+                                                           'fifo':    'fifo' }
+  assert [ k for k,e in sorted(entries.items()) if e.is_dir ] == ['dir', 'dirlink']
+  assert os.fspath(entries['file']) == str(tmp_path/'file')
+
+
+def test_listing_cache_mtime_validation(tmp_path, monkeypatch):
+  monkeypatch.setattr(ListingCache, 'RACY_NS', 0)
+  (tmp_path/'a').touch()
+  cache = ListingCache()
+  listing = cache.get(tmp_path)
+  assert cache.get(tmp_path) is listing
+  (tmp_path/'b').touch()
+  os.utime(tmp_path, ns=(0, listing.mtime_ns + 1))
+  listing = cache.get(tmp_path)
+  assert sorted(e.name for e in listing.entries) == ['a', 'b']
+  assert cache.get(tmp_path, force=True) is not listing
+
+
+def test_listing_cache_eviction(tmp_path, monkeypatch):
+  monkeypatch.setattr(ListingCache, 'RACY_NS', 0)
+  for d in ['x', 'y', 'z']:
+    (tmp_path/d).mkdir()
+    (tmp_path/d/'1').touch()
+    (tmp_path/d/'2').touch()
+  cache = ListingCache(max_entries=4)
+  cache.get(tmp_path/'x')
+  cache.get(tmp_path/'y')
+  cache.get(tmp_path/'x')
+  cache.get(tmp_path/'z')
+  assert tmp_path/'x' in cache and tmp_path/'z' in cache
+  assert tmp_path/'y' not in cache
+  assert cache.size == 4
+
+
+def test_sorted_incrementally():
+  items = [ random.random() for _ in range(1000) ]
+  assert sorted_incrementally(items, chunk_size=64) == sorted(items)
+  assert sorted_incrementally(items, key=lambda x: -x, chunk_size=7) == sorted(items, reverse=True)
+
+
+def test_listing_update(tmp_path):
+  for name in ['a', 'c', '.h']:
+    (tmp_path/name).touch()
+  no_hidden = lambda entries: [ e for e in entries if not e.name.startswith('.') ]
+  by_name   = lambda entries, sorter=sorted: sorter(entries, key=name_key)
+  listing   = Listing(scandir(tmp_path), 0)
+  view      = listing.view(no_hidden, by_name)
+  (tmp_path/'b').mkdir()
+  (tmp_path/'a').unlink()
+  (tmp_path/'.i').touch()
+  listing.update(str(tmp_path), ['a', 'b', '.i'], no_hidden, by_name, name_key)
+  assert listing.view(no_hidden, by_name) is view
+  assert [ (e.name, e.filetype) for e in view ] == [('b', 'directory'), ('c', 'file')]
+  assert sorted(e.name for e in listing.entries) == ['.h', '.i', 'b', 'c']
+  old = listing.by_name['c']
+  listing.update(str(tmp_path), ['c'], no_hidden, by_name, name_key) # a changed entry replaces the old one
+  assert [ e for e in listing.entries if e.name == 'c' ] == [listing.by_name['c']] != [old]
@@ -0,0 +1,83 @@
+import os, threading
+from .core import *
+from src.listing import PathEntry
+from src.preview import Previewer
+
+
+def load(previewer, path, is_dir=False):
+  ready = threading.Event()
+  previewer.on_ready = lambda path, lines, stamp: (previewer.store(path, lines, stamp), ready.set())
+  lines = previewer.get(PathEntry(path.name, str(path), 'directory' if is_dir else 'file', is_dir))
+  if lines is None:
+    assert ready.wait(5)
+    lines = previewer.cache[str(path)][1]
+  return lines
+
+
+def test_previewer(tmp_path):
+  (tmp_path/'text').write_text('one\ttab\nt\x1bwo\n' + 'x' * 5000)
+  (tmp_path/'binary').write_bytes(bytes(range(20)))
+  (tmp_path/'empty').touch()
+  (tmp_path/'dir').mkdir()
+  (tmp_path/'dir'/'sub').mkdir()
+  (tmp_path/'dir'/'file').touch()
+  previewer = Previewer(cache_size=3, max_bytes=64)
+  try:
+    assert load(previewer, tmp_path/'text') == ['one tab', 't.wo', 'x' * (64 - 13)]
+    assert load(previewer, tmp_path/'binary') == [
+      '00000000  00 01 02 03 04 05 06 07 08 09 0a 0b 0c 0d 0e 0f  ................',
+      '00000010  10 11 12 13                                      ....' ]
+    assert load(previewer, tmp_path/'empty') == ['(empty file)']
+    assert load(previewer, tmp_path/'dir', is_dir=True) == ['2 entries: 1 directories, 1 files', '', 'file', 'sub/']
+    assert list(previewer.cache) == [ str(tmp_path/name) for name in ('binary', 'empty', 'dir') ]
+    assert load(previewer, tmp_path/'missing') == ['No such file or directory']
+  finally:
+    previewer.close()
+
+
+def test_previewer_drops_stale_requests(tmp_path):
+  (tmp_path/'a').write_text('a')
+  previewer = Previewer()
+  loaded = []
+  previewer.on_ready = lambda path, lines, stamp: loaded.append(path)
+  previewer.wanted = str(tmp_path/'b') # the cursor moved on before the worker started
+  previewer.load(str(tmp_path/'a'), False)
+  assert loaded == []
+  previewer.close()
+
+
+
+def test_previewer_revalidates_changed_files(tmp_path):
+  log = tmp_path/'log'
+  log.write_text('one\n')
+  os.utime(log, ns=(1_000_000_000, 1_000_000_000)) # old enough for the stamp to be trusted
+  previewer = Previewer()
+  try:
+    assert load(previewer, log) == ['one']
+    stamp, _ = previewer.cache[str(log)]
+    reloaded = []
+    previewer.on_ready = lambda path, lines, stamp: reloaded.append(lines)
+    previewer.load(str(log), False, stamp) # the revalidation of an unchanged preview
+    assert reloaded == []
+    with open(log, 'a') as f: f.write('two\n')
+    os.utime(log, ns=(2_000_000_000, 2_000_000_000))
+    ready = threading.Event()
+    previewer.on_ready = lambda path, lines, stamp: (previewer.store(path, lines, stamp), ready.set())
+    assert previewer.get(PathEntry('log', str(log), 'file', False)) == ['one'] # at once, from the cache
+    assert ready.wait(5) and previewer.cache[str(log)][1] == ['one', 'two']
+  finally:
+    previewer.close()
+
+
+def test_preview_follows_background_changes(tmp_path):
+  for name in ('a', 'b'): (tmp_path/name).touch()
+  ips = InteractivePathSelector(root=tmp_path, tty=os.devnull, preview=True)
+  try:
+    ips.update_preview()
+    assert ips.preview_wanted == str(tmp_path/'a')
+    (tmp_path/'a').unlink() # as reported by the watcher
+    ips.post(ips.apply_changes, str(tmp_path), {'a'})
+    ips.run_posted()
+    assert ips.path_list_get().name == 'b' and ips.preview_wanted == str(tmp_path/'b')
+  finally:
+    ips.close()
@@ -0,0 +1,29 @@
+from .core import *
+from src.search import SearchIndex
+
+
+def test_search_index_walks_tree(tmp_path):
+  (tmp_path/'a'/'b').mkdir(parents=True)
+  (tmp_path/'a'/'b'/'file').touch()
+  (tmp_path/'.hidden').mkdir()
+  (tmp_path/'.hidden'/'file').touch()
+  (tmp_path/'link').symlink_to(tmp_path/'a')
+  index = SearchIndex(tmp_path, workers=2).start().wait(5)
+  assert index.done
+  assert sorted(entry.name for entry in index.entries) == ['a', 'a/b', 'a/b/file', 'link']
+  assert [ entry.is_dir for entry in index.entries if entry.name == 'link' ] == [True]
+  index = SearchIndex(tmp_path, show_hidden=True).start().wait(5)
+  assert {'.hidden', '.hidden/file'} < { entry.name for entry in index.entries }
+
+
+def test_forced_refresh_cancels_search_indexes(tmp_path):
+  import os
+  (tmp_path/'a').touch()
+  ips = InteractivePathSelector(root=tmp_path, tty=os.devnull)
+  try:
+    ips.start_search()
+    index = ips.search
+    ips.refresh(force=True)
+    assert index.cancelled and ips.search is not index
+  finally:
+    ips.close()
@@ -0,0 +1,63 @@
+import os
+from .core import *
+from src.selection import SelectionTree
+
+
+def test_selection_tree_counts():
+  tree = SelectionTree()
+  tree.select('a')
+  sub = tree.child('d').child('e')
+  sub.select('f')
+  sub.select('.g')
+  assert tree.count == 3 and tree.direct == 1 and tree['d'].count == 2
+  assert sub.selected_count(show_hidden=False) == 1
+  assert tree.has_selection('d')
+  sub.deselect('f')
+  sub.deselect('.g')
+  assert not tree.has_selection('d') and tree.count == 1
+  tree['d'].prune('e')
+  tree.prune('d')
+  assert tree == {'a': True}
+
+
+def test_selection_tree_select_all():
+  tree = SelectionTree()
+  tree.child('d').select('x')
+  tree.select_all(['a', 'd', '.h'])
+  assert tree == {'a': True, 'd': True, '.h': True}
+  assert (tree.count, tree.direct, tree.hidden, tree.nested) == (3, 3, 1, 0)
+  tree.clear()
+  assert tree == {} and tree.count == 0
+
+
+
+def test_selection_tree_bulk():
+  tree = SelectionTree()
+  tree.select('z')
+  tree.select_all(['c', 'a', 'z', 'b'])
+  assert tree.bulk == ('c', 'a', 'z', 'b') and dict.__len__(tree) == 1 # only 'z' is stored explicitly
+  assert list(tree.items()) == [('z', True), ('c', True), ('a', True), ('b', True)]
+  tree.deselect('a')
+  tree.child('b').select('x')
+  assert tree == {'z': True, 'c': True, 'b': {'x': True}}
+  assert list(tree.keys()) == ['z', 'b', 'c'] and list(tree.values()) == [True, tree['b'], True]
+  assert (tree.count, tree.direct, tree.nested) == (3, 2, 1)
+  tree.select('a')
+  tree.select_all(['d'])
+  assert tree == {'z': True, 'b': {'x': True}, 'c': True, 'a': True, 'd': True}
+  assert tree.count == 5 and len(tree) == 5
+
+
+def test_all_selected_ignores_vanished_names(tmp_path):
+  for name in ('a', 'b', 'c'): (tmp_path/name).touch()
+  ips = InteractivePathSelector(root=tmp_path, tty=os.devnull)
+  try:
+    ips.toggle_all_selected()
+    assert ips.all_selected()
+    (tmp_path/'c').rename(tmp_path/'d')
+    ips.refresh(force=True)
+    assert not ips.all_selected() # c still counts, but d is not selected
+    ips.toggle_all_selected()
+    assert ips.get_selection_dict() == {'a': True, 'b': True, 'c': True, 'd': True}
+  finally:
+    ips.close()
@@ -0,0 +1,49 @@
+import os
+from .core import *
+from src.session import Session
+
+
+def test_session_roundtrip(tmp_path):
+  root = tmp_path/'root'
+  (root/'a'/'deep').mkdir(parents=True)
+  for name in ('x', 'y', 'z'): (root/'a'/name).touch()
+  (root/'b').mkdir()
+  for directory in (root, root/'a', root/'a'/'deep', root/'b'): # old enough for listings not to be racy
+    os.utime(directory, ns=(1_000_000_000, 1_000_000_000))
+  session = Session('work', directory=tmp_path/'sessions')
+  assert session.load() is None
+
+  ips = InteractivePathSelector(root=root, tty=os.devnull)
+  try:
+    ips.index = ips.path_list_find('b')
+    ips.descend()
+    ips.ascend()
+    ips.index = ips.path_list_find('a')
+    ips.descend()
+    ips.index = ips.path_list_find('deep')
+    ips.descend()
+    ips.ascend()
+    ips.index = ips.path_list_find('y')
+    ips.toggle_selected()
+    ips.toggle_all_selected()
+    ips.subselection.deselect('z')
+    selection = ips.get_selection_dict()
+    session.save(ips)
+  finally:
+    ips.close()
+
+  (root/'b'/'new').touch() # only b changed since the snapshot
+  ips = InteractivePathSelector(root=root, tty=os.devnull)
+  try:
+    assert session.restore(ips, session.load())
+    assert ips.cwd == root/'a' and ips.path_list_get().name == 'y'
+    assert ips.get_selection_dict() == selection == {'a': {'deep': True, 'x': True, 'y': True}}
+    restored = ips.listing_cache.peek(root/'b')
+    assert restored.entries == []
+    assert ips.listing_cache.get(root/'a/deep') is ips.listing_cache.peek(root/'a/deep') is not None
+    assert [ entry.name for entry in ips.listing_cache.get(root/'b').entries ] == ['new'] # re-listed
+  finally:
+    ips.close()
+
+  with pytest.raises(ValueError):
+    Session('../escape')
@@ -0,0 +1,45 @@
+from .core import *
+from src.listing import PathEntry
+from src.sorting import SortOrder
+
+
+def entries(*names):
+  return [ PathEntry(name, name, 'directory' if name.endswith('/') else 'file', name.endswith('/')) for name in names ]
+
+
+def sorted_names(mode, names, dirs_first=False):
+  return [ entry.name for entry in SortOrder.get(mode, dirs_first)(entries(*names)) ]
+
+
+def test_sort_modes():
+  names = ['file10', 'File2', 'file2', 'file1.txt', 'pkg-1.10', 'pkg-1.0', 'pkg-1.0rc1', 'pkg-1.0.1', 'pkg-1.9']
+  assert sorted_names('plain', names) == sorted(names)
+  assert sorted_names('casefold', names) == ['file1.txt', 'file10', 'File2', 'file2', 'pkg-1.0', 'pkg-1.0.1',
+                                             'pkg-1.0rc1', 'pkg-1.10', 'pkg-1.9']
+  assert sorted_names('natural', names) == ['File2', 'file1.txt', 'file2', 'file10', 'pkg-1.0', 'pkg-1.0.1',
+                                            'pkg-1.0rc1', 'pkg-1.9', 'pkg-1.10']
+  assert sorted_names('version', names) == ['file1.txt', 'File2', 'file2', 'file10', 'pkg-1.0rc1', 'pkg-1.0',
+                                            'pkg-1.0.1', 'pkg-1.9', 'pkg-1.10']
+  assert sorted_names('natural', ['b10', 'a/', 'b9/'], dirs_first=True) == ['a/', 'b9/', 'b10']
+
+
+def test_sort_keys_are_memoized():
+  listing = entries('b2', 'b10')
+  order   = SortOrder.get('natural')
+  assert SortOrder.get('natural') is order and order.next_mode() is SortOrder.get('version')
+  order(listing)
+  keys = [ entry.sort_keys['natural'] for entry in listing ]
+  order.with_dirs_first(True)(listing)
+  assert all( new is old for new, old in zip(( entry.sort_keys['natural'] for entry in listing ), keys) )
+  with pytest.raises(ValueError):
+    SortOrder.get('random')
+
+
+def test_dirs_first_toggle_names_the_sort_mode(tmp_path):
+  import os
+  ips = InteractivePathSelector(root=tmp_path, tty=os.devnull, sort='natural', dirs_first=True)
+  try:
+    ips.toggle_show_dirs_first()
+    assert 'All listed naturally, file2 before file10' in ips.screen[0]
+  finally:
+    ips.close()
@@ -1,3 +1,4 @@
+import os, signal
 from .core import *
 
 
@@ -14,8 +15,7 @@ def test_basic_selection(session_tmp_path):
 
 def test_toggle_selected(capturable_interactive_path_selector, ANSI_capsys):
   with capturable_interactive_path_selector() as ips:
-    ips.selection={}
-    ips.subselection=ips.selection
+    ips.clear_selection()
     ips.toggle_selected()
     ips.toggle_selected()
   out, err = ANSI_capsys.readouterr()
@@ -24,11 +24,23 @@ def test_toggle_selected(capturable_interactive_path_selector, ANSI_capsys):
 
 def test_draw_page(capturable_interactive_path_selector, ANSI_capsys):
   with capturable_interactive_path_selector() as ips:
-    ips.selection={}
-    ips.subselection=ips.selection
+    ips.clear_selection()
     ips.draw_page()
   out, err = ANSI_capsys.readouterr()
-  assert '1/4\n file\n hash/\n hidden/\n nest/> file' in out
+  assert '1/4\n> file\n hash/\n hidden/\n nest/' in out
+
+
+def test_draw_page_damage_tracking(capturable_interactive_path_selector, ANSI_capsys):
+  with capturable_interactive_path_selector(dirs_first=False) as ips:
+    ips.clear_selection()
+    ips.draw_page()
+    ANSI_capsys.readouterr()
+    ips.draw_page()
+    assert ANSI_capsys.readouterr()[0] == ''
+    ips.row_down()
+    out, err = ANSI_capsys.readouterr()
+  assert out.startswith('file') and out.endswith('   2/4> hash/')
+  assert out.count('file') == 1 # only the two changed rows and the header were redrawn
 
 
 def test_truncating_paths(capturable_interactive_path_selector, ANSI_capsys):
@@ -45,6 +57,7 @@ def test_truncating_header(capturable_interactive_path_selector, ANSI_capsys):
     ips.row_down()
     for i in range(9):
       ips.select_or_descend()
+    ips.draw_header_alert('')
     ips.draw_header_info()
   out, err = ANSI_capsys.readouterr()
   assert out.endswith('...t/nest/nest/nest/nest/nest/nest   1/1')
@@ -52,8 +65,7 @@ def test_truncating_header(capturable_interactive_path_selector, ANSI_capsys):
 
 def test_hidden_false(capturable_interactive_path_selector, ANSI_capsys):
   with capturable_interactive_path_selector(show_hidden=False) as ips:
-    ips.selection={}
-    ips.subselection=ips.selection
+    ips.clear_selection()
 
     ips.row_down()
     ips.row_down()
@@ -69,8 +81,7 @@ def test_hidden_false(capturable_interactive_path_selector, ANSI_capsys):
 
 def test_hidden_true(capturable_interactive_path_selector, ANSI_capsys):
   with capturable_interactive_path_selector(show_hidden=True) as ips:
-    ips.selection={}
-    ips.subselection=ips.selection
+    ips.clear_selection()
 
     ips.row_down()
     ips.row_down()
@@ -90,8 +101,7 @@ def test_hidden_true(capturable_interactive_path_selector, ANSI_capsys):
 
 def test_dir_first_false(capturable_interactive_path_selector, ANSI_capsys):
   with capturable_interactive_path_selector(dirs_first=False) as ips:
-    ips.selection={}
-    ips.subselection=ips.selection
+    ips.clear_selection()
     ips.select_or_descend()
   out, err = ANSI_capsys.readouterr()
   assert out == '> +file'
@@ -99,8 +109,7 @@ def test_dir_first_false(capturable_interactive_path_selector, ANSI_capsys):
 
 def test_dir_first_true(capturable_interactive_path_selector, ANSI_capsys):
   with capturable_interactive_path_selector(dirs_first=True) as ips:
-    ips.selection={}
-    ips.subselection=ips.selection
+    ips.clear_selection()
     ips.select_or_descend()
   out, err = ANSI_capsys.readouterr()
   assert out != '> +file'
@@ -114,8 +123,7 @@ def test_alt_style(capturable_interactive_path_selector, ANSI_capsys):
             'selected':   {'prefix': '!', 'suffix': '!'}}
   with capturable_interactive_path_selector( dirs_first=False,
                                              style=style ) as ips:
-    ips.selection={}
-    ips.subselection=ips.selection
+    ips.clear_selection()
     ips.refresh()
     ips.select_or_descend()
     ips.row_down()
@@ -138,22 +146,32 @@ def test_keybind_toggle_all_selected(capturable_interactive_path_selector, ANSI_
   assert ips.get_selection_dict() == {'hash':True,'nest':True,'file':True,'hidden':True}
 
 
+def test_keybind_toggle_all_deselected(capturable_interactive_path_selector, ANSI_capsys):
+  with capturable_interactive_path_selector() as ips:
+    ips.clear_selection()
+    ips.toggle_selected()
+    ips.toggle_all_selected()
+    assert ips.all_selected()
+    ips.toggle_all_selected()
+  out, err = ANSI_capsys.readouterr()
+  assert ips.get_selection_dict() == {}
+  assert out.endswith('All deselected')
+
+
 def test_keybind_toggle_show_dirs_first(capturable_interactive_path_selector, ANSI_capsys):
   with capturable_interactive_path_selector(dirs_first=False) as ips:
-    ips.selection={}
-    ips.subselection=ips.selection
+    ips.clear_selection()
     ips.draw_page()
     ips.toggle_show_dirs_first()
   out, err = ANSI_capsys.readouterr()
   out = out.replace('\n','')
   assert 'file hash/ hidden/ nest/' in out
-  assert 'hash/ hidden/ nest/ file' in out
+  assert 'hash/ hidden/ nest/> file' in out
 
 
 def test_keybind_toggle_show_hidden(capturable_interactive_path_selector, ANSI_capsys):
   with capturable_interactive_path_selector(show_hidden=False) as ips:
-    ips.selection={}
-    ips.subselection=ips.selection
+    ips.clear_selection()
     ips.row_down()
     ips.row_down()
     ips.select_or_descend()
@@ -168,13 +186,153 @@ def test_keybind_toggle_show_hidden(capturable_interactive_path_selector, ANSI_c
 def test_keybind_refresh_manual(capturable_interactive_path_selector, ANSI_capsys, session_tmp_path):
   new = session_tmp_path/'new'
   with capturable_interactive_path_selector() as ips:
-    ips.selection={}
-    ips.subselection=ips.selection
+    ips.clear_selection()
     ips.draw_page()
     new.touch()
     ips.refresh_manual()
     new.unlink()
   out, err = ANSI_capsys.readouterr()
   out = out.replace('\n','')
-  assert 'file hash/ hidden/ nest/>' in out
-  assert 'file hash/ hidden/ nest/ new>' in out
\ No newline at end of file
+  assert '1/4> file hash/ hidden/ nest/' in out
+  assert '1/5 new' in out
+
+def test_streaming_listing(capturable_interactive_path_selector, ANSI_capsys):
+  with capturable_interactive_path_selector(stream_threshold=2, dirs_first=True) as ips:
+    stream = ips.stream
+    assert stream is not None
+    stream.join()
+    ips.run_posted()
+    assert ips.stream is None
+    assert [p.name for p in ips.path_list] == ['hash', 'hidden', 'nest', 'file']
+  out, err = ANSI_capsys.readouterr()
+  assert '1/4' in out
+
+
+def test_watch_updates_listing(capturable_interactive_path_selector, ANSI_capsys, session_tmp_path):
+  with capturable_interactive_path_selector(watch=True, dirs_first=True) as ips:
+    ips.clear_selection()
+    ips.row_down()
+    ips.row_down()
+    ips.row_down()
+    (session_tmp_path/'aaa').mkdir()
+    try:
+      for _ in range(500):
+        if ips.posted: break
+        ips.watcher.join(0.01)
+      assert ips.posted, 'the watcher never reported the change'
+      ips.run_posted()
+    finally:
+      (session_tmp_path/'aaa').rmdir()
+  out, err = ANSI_capsys.readouterr()
+  assert [p.name for p in ips.path_list] == ['aaa', 'hash', 'hidden', 'nest', 'file']
+  assert ips.path_list_get().name == 'file'
+  assert out.replace('\n','').endswith('5/5 aaa/ hash/ hidden/ nest/> file')
+
+
+def test_filter_as_you_type(capturable_interactive_path_selector, ANSI_capsys):
+  with capturable_interactive_path_selector(dirs_first=True) as ips:
+    ips.clear_selection()
+    ips.dispatch_key('/')
+    for key in 'ie':
+      ips.input_handler(key)
+    assert [p.name for p in ips.path_list] == ['file', 'hidden']
+    ips.input_handler('\n')
+    ips.toggle_all_selected()
+    assert ips.get_selection_dict() == {'file': True, 'hidden': True}
+    ips.dispatch_key('\033')
+    assert ips.filter is None and ips.path_list_len == 4
+    assert ips.path_list_get().name == 'file'
+  out, err = ANSI_capsys.readouterr()
+  assert '/ie_   1/2' in out
+
+
+def test_recursive_search(capturable_interactive_path_selector, ANSI_capsys):
+  with capturable_interactive_path_selector(dirs_first=True) as ips:
+    ips.clear_selection()
+    ips.start_search()
+    index = ips.search
+    index.wait(5)
+    ips.run_posted()
+    assert ips.path_list_len == 20
+    for key in 'nest/nest/file':
+      ips.input_handler(key)
+    assert ips.path_list_get().name == 'nest/nest/file'
+    ips.input_handler('\n')
+    ips.toggle_selected()
+    ips.escape() # drops the query
+    ips.escape() # leaves the search
+    assert ips.search is None and ips.path_list_get().name == 'hash'
+    ips.start_search()
+    assert ips.search is index # the tree is not walked again
+    ips.escape()
+    ips.escape()
+  assert ips.get_selection_dict() == {'nest': {'nest': {'file': True}}}
+  out, err = ANSI_capsys.readouterr()
+  assert '/**   /nest/nest/file_   1/' in out
+
+
+def test_profiler(capturable_interactive_path_selector, ANSI_capsys, tmp_path):
+  from src.profiler import Profiler
+  with capturable_interactive_path_selector() as ips:
+    profiler = Profiler().instrument(ips)
+    ips.handle_key('j')
+    ips.handle_key('\x12') # ctrl-r
+  profiler.report(tmp_path/'profile')
+  report = (tmp_path/'profile').read_text()
+  assert report.startswith('pathpick profile: 2 keys')
+  assert '  ls           n=1 ' in report and '  draw_page    n=1 ' in report
+  assert [ key for key, _, _ in profiler.keys ] == ['j', '\x12']
+  profiler.report(tmp_path) # a directory: reported on stderr, not raised
+
+
+def test_coalesced_movement(capturable_interactive_path_selector, ANSI_capsys):
+  with capturable_interactive_path_selector(dirs_first=True) as ips:
+    ips.clear_selection()
+    ips.draw_page()
+    ANSI_capsys.readouterr()
+    assert ips.handle_keys(['j'] * 6 + ['k', '\x1b[B', ' ']) # 6 steps from the first row wrap to the third
+    assert ips.path_list_get().name == 'nest' and ips.get_selection_dict() == {'nest': True}
+    out, err = ANSI_capsys.readouterr()
+    assert out.count('hidden') == 0 # the cursor passed over it without drawing it
+    ips.handle_keys(['\x1b[6~', '\x1b[5~', '\x1b[5~'])
+    assert ips.index == 0
+
+
+def test_event_loop(capturable_interactive_path_selector, ANSI_capsys, monkeypatch):
+  with capturable_interactive_path_selector(dirs_first=True) as ips:
+    ips.clear_selection()
+    resize = ips.resize
+    monkeypatch.setattr(ips, 'resize', lambda: (resize(), ips.stop('resized')))
+    ips.post(ips.row_down)
+    ips.post(os.kill, os.getpid(), signal.SIGWINCH)
+    assert ips.run() == 'resized'
+    assert ips.path_list_get().name == 'hidden'
+    ips.post(lambda: ips.end(throw=True))
+    with pytest.raises(KeyboardInterrupt):
+      ips.run()
+
+
+def test_write_selection_paths(capturable_interactive_path_selector, ANSI_capsys, session_tmp_path):
+  import io
+  with capturable_interactive_path_selector(dirs_first=True) as ips:
+    ips.clear_selection()
+    ips.selection.merge({'file': True, 'nest': {'nest': {'file': True}, 'file': True}, 'hash': True})
+  output = io.BytesIO()
+  ips.write_selection_paths(output, '\0', chunk_paths=2)
+  root = str(session_tmp_path)
+  paths = [f'{root}/file', f'{root}/nest/nest/file', f'{root}/nest/file', f'{root}/hash']
+  assert ips.get_selection_paths() == paths
+  assert output.getvalue() == ''.join( f'{path}\0' for path in paths ).encode()
+
+
+def test_preview_pane(capturable_interactive_path_selector, ANSI_capsys):
+  with capturable_interactive_path_selector(dirs_first=True, preview=True) as ips:
+    ips.clear_selection()
+    ips.draw_page()
+    ips.update_preview()
+    ips.preview.executor.shutdown(wait=True) # let the worker finish, as the event loop would
+    while ips.posted:
+      callback, args = ips.posted.popleft()
+      callback(*args)
+    assert ips.list_width == 20 and ips.preview_lines[0] == '1 entry: 0 directories, 1 files'
+    assert ips.screen[1].endswith(ips.style['preview'].format('1 entry: 0 dire...'))
@@ -0,0 +1,88 @@
+import time
+from .core import *
+from src.selection import SelectionTree
+from src.usage import SelectionUsage, format_size
+
+
+def settle(usage, tree, root):
+  """totals() once every requested size has been measured"""
+  for _ in range(500):
+    size, files, pending = usage.totals(tree, root)
+    if not pending: return size, files
+    time.sleep(0.01)
+    usage.apply_results()
+  raise AssertionError('selection usage never settled')
+
+
+def test_selection_usage(tmp_path):
+  (tmp_path/'dir'/'sub').mkdir(parents=True)
+  (tmp_path/'dir'/'a').write_bytes(b'x' * 10)
+  (tmp_path/'dir'/'sub'/'b').write_bytes(b'x' * 100)
+  (tmp_path/'file').write_bytes(b'x' * 1000)
+  for i in range(5): (tmp_path/f'bulk{i}').write_bytes(b'x' * 3)
+  usage, tree, root = SelectionUsage(workers=2), SelectionTree(), str(tmp_path)
+  try:
+    tree.select('dir')
+    tree.select('file')
+    assert settle(usage, tree, root) == (1110, 3)
+    tree.deselect('file')
+    version = tree.version
+    assert usage.totals(tree, root) == (110, 2, 0) # no new measurement needed
+    tree.select_all([ f'bulk{i}' for i in range(5) ])
+    tree.deselect('bulk0')
+    assert tree.version > version
+    assert settle(usage, tree, root) == (110 + 12, 6)
+    (tmp_path/'dir'/'c').write_bytes(b'x')
+    usage.clear()
+    assert settle(usage, tree, root) == (111 + 12, 7)
+  finally:
+    usage.close()
+
+
+def test_format_size():
+  assert [ format_size(n) for n in (0, 1023, 1536, 10 * 1024 ** 2, 3 * 1024 ** 5) ] == ['0B', '1023B', '1.5K', '10M', '3.0P']
+
+
+def test_selection_usage_releases_bulks(tmp_path):
+  import gc
+  (tmp_path/'dir').mkdir()
+  for i in range(3): (tmp_path/'dir'/f'{i}').write_bytes(b'x')
+  usage, tree, root = SelectionUsage(workers=2), SelectionTree(), str(tmp_path)
+  try:
+    node = tree.child('dir')
+    for _ in range(3): # every select-all makes a new bulk tuple
+      node.select_all(['0', '1', '2'])
+      assert settle(usage, tree, root) == (3, 3)
+    assert len(usage.bulk) == 1 and usage.bulk[id(node)][0] is node.bulk
+    node.clear()
+    usage.totals(tree, root)
+    assert usage.bulk[id(node)][0] is None and usage.bulk[id(node)][1] == {}
+    tree.clear()
+    del node
+    gc.collect()
+    assert usage.bulk == {}
+  finally:
+    usage.close()
+
+
+def test_selection_usage_requests_one_task_per_node(tmp_path):
+  import gc
+  (tmp_path/'dir').mkdir()
+  for i in range(10): (tmp_path/'dir'/f'{i}').write_bytes(b'x')
+  usage, tree, root = SelectionUsage(workers=2), SelectionTree(), str(tmp_path)
+  usage.chunk_size = 3
+  submitted, submit = [], usage.submit
+  usage.submit = lambda function, *args: (submitted.append(function.__name__), submit(function, *args))
+  try:
+    node = tree.child('dir')
+    for i in range(10): node.select(f'{i}')
+    assert usage.totals(tree, root) == (0, 0, 10)
+    assert settle(usage, tree, root) == (10, 10)
+    assert submitted.count('split_names') == 1 # the UI thread hands the node over in one task
+    assert submitted.count('measure_names') == 4
+    tree.clear()
+    del node
+    gc.collect()
+    assert usage.explicit == {}
+  finally:
+    usage.close()
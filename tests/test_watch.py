@@ -0,0 +1,48 @@
+import queue, time
+import pytest
+from .core import *
+from src.watch import InotifyWatcher, PollingWatcher
+
+
+@pytest.mark.parametrize('watcher_class', [InotifyWatcher, PollingWatcher])
+def test_watcher_reports_changes(tmp_path, watcher_class):
+  (tmp_path/'old').touch()
+  changes = queue.Queue()
+  watcher = watcher_class(lambda path, names: changes.put((path, names)))
+  if watcher_class is PollingWatcher:
+    watcher.interval = 0.01
+  watcher.watch(tmp_path)
+  watcher.start()
+  try:
+    if watcher_class is PollingWatcher:
+      for _ in range(500): # wait for the baseline poll
+        if watcher.names is not None: break
+        time.sleep(0.01)
+      assert watcher.names is not None, 'the watcher never polled'
+    (tmp_path/'new').touch()
+    (tmp_path/'old').rename(tmp_path/'renamed')
+    names = set()
+    while names != {'new', 'old', 'renamed'}:
+      path, batch = changes.get(timeout=5)
+      assert path == str(tmp_path)
+      names |= batch
+  finally:
+    watcher.close()
+
+
+def test_unwatchable_directory_falls_back_to_polling(tmp_path, monkeypatch):
+  import errno, os
+  watcher = InotifyWatcher(lambda path, names: None)
+  with pytest.raises(FileNotFoundError):
+    watcher.watch(tmp_path/'missing')
+  assert watcher.path is None
+  watcher.close()
+
+  def watch(self, path): raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC), path)
+  monkeypatch.setattr(InotifyWatcher, 'watch', watch)
+  ips = InteractivePathSelector(root=tmp_path, tty=os.devnull, watch=True)
+  try:
+    assert isinstance(ips.watcher, PollingWatcher) and ips.watcher.is_alive()
+    assert ips.watcher.path == str(tmp_path)
+  finally:
+    ips.close()